@@ -0,0 +1,335 @@
+import logic
+import sys
+
+# =============================================================================
+# Reduced Ordered Binary Decision Diagrams
+# =============================================================================
+
+# Nodes are ints indexing the BDD's node lists, with the terminals first.
+FALSE, TRUE = range(2)
+TERMINAL = sys.maxsize # the level of the terminals, below every variable
+
+AND, OR, XOR = range(3)
+
+class BDD(object):
+    """A table of unique nodes shared by binary decision diagrams
+
+    Variables are ordered as they are added; each node tests a variable,
+    leading to its low node when false and its high node when true.
+    """
+
+    def __init__(self, names=()):
+        self.names = []
+        self.levels = {}
+        self.var_levels = [TERMINAL, TERMINAL]
+        self.lows = [None, None]
+        self.highs = [None, None]
+        self.unique = {}
+        self.cache = {}
+        for name in names:
+            self.add_var(name)
+
+    def __len__(self):
+        return len(self.lows)
+
+    def add_var(self, name):
+        if name not in self.levels:
+            self.levels[name] = len(self.names)
+            self.names.append(name)
+        return self.levels[name]
+
+    def node(self, level, low, high):
+        # the unique node for level, low and high
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = len(self.lows)
+            self.var_levels.append(level)
+            self.lows.append(low)
+            self.highs.append(high)
+            self.unique[key] = node
+        return node
+
+    def cofactors(self, node, level):
+        # the low and high nodes of node for the variable at level
+        if self.var_levels[node] == level:
+            return self.lows[node], self.highs[node]
+        return node, node
+
+    def apply(self, op, u, v):
+        """Returns the node for u AND, OR or XOR v"""
+        if u > v:
+            u, v = v, u
+        if u <= TRUE and v <= TRUE:
+            return (u & v, u | v, u ^ v)[op]
+        if op == AND:
+            if u == FALSE:
+                return FALSE
+            if u == TRUE or u == v:
+                return v
+        elif op == OR:
+            if u == TRUE:
+                return TRUE
+            if u == FALSE or u == v:
+                return v
+        elif u == FALSE:
+            return v
+        elif u == v:
+            return FALSE
+
+        key = (op, u, v)
+        if key not in self.cache:
+            level = min(self.var_levels[u], self.var_levels[v])
+            u0, u1 = self.cofactors(u, level)
+            v0, v1 = self.cofactors(v, level)
+            self.cache[key] = self.node(level, self.apply(op, u0, v0),
+                                        self.apply(op, u1, v1))
+        return self.cache[key]
+
+    def apply_rule(self, rule, *nodes):
+        """Returns the node for rule applied to nodes, e.g. a custom rule"""
+        if all(node <= TRUE for node in nodes):
+            return TRUE if rule(*map(bool, nodes)) else FALSE
+
+        key = (rule,) + nodes
+        if key not in self.cache:
+            level = min(self.var_levels[node] for node in nodes)
+            cofactors = [self.cofactors(node, level) for node in nodes]
+            low = self.apply_rule(rule, *[c[0] for c in cofactors])
+            high = self.apply_rule(rule, *[c[1] for c in cofactors])
+            self.cache[key] = self.node(level, low, high)
+        return self.cache[key]
+
+    def restrict(self, node, values):
+        """Returns node with the variables at the levels in values fixed
+
+        Note: values is a dictionary in the form of {level: True/False}
+        """
+        last = max(values)
+        values_key = tuple(sorted(values.items()))
+
+        def restrict(node):
+            level = self.var_levels[node]
+            if level > last:
+                return node
+            key = ('restrict', node, values_key)
+            if key not in self.cache:
+                if level in values:
+                    branch = self.highs if values[level] else self.lows
+                    result = restrict(branch[node])
+                else:
+                    result = self.node(level, restrict(self.lows[node]),
+                                       restrict(self.highs[node]))
+                self.cache[key] = result
+            return self.cache[key]
+
+        return restrict(node)
+
+    def exists(self, node, levels):
+        """Returns node with the variables at levels quantified away"""
+        last = max(levels)
+
+        def exists(node):
+            level = self.var_levels[node]
+            if level > last:
+                return node
+            key = ('exists', node, levels)
+            if key not in self.cache:
+                low, high = exists(self.lows[node]), exists(self.highs[node])
+                if level in levels:
+                    result = self.apply(OR, low, high)
+                else:
+                    result = self.node(level, low, high)
+                self.cache[key] = result
+            return self.cache[key]
+
+        return exists(node)
+
+    def count(self, node):
+        """Returns the number of assignments to every variable satisfying node"""
+        counts = {FALSE: 0, TRUE: 1}
+        num_vars = len(self.names)
+
+        def level(node):
+            return min(self.var_levels[node], num_vars)
+
+        def count(node):
+            if node not in counts:
+                low, high = self.lows[node], self.highs[node]
+                counts[node] = (
+                    (count(low) << (level(low) - level(node) - 1)) +
+                    (count(high) << (level(high) - level(node) - 1)))
+            return counts[node]
+
+        return count(node) << level(node)
+
+    def var(self, name):
+        """Returns the Function of the variable name"""
+        return Function(self, self.node(self.add_var(name), FALSE, TRUE))
+
+    def true(self):
+        return Function(self, TRUE)
+
+    def false(self):
+        return Function(self, FALSE)
+
+    def build(self, expr):
+        """Returns the Function of a logic expression
+
+        Operations apply their bitwise rule to Functions, and custom
+        operations without one have their rule applied node by node.
+        """
+        expr = logic.parse(expr)
+        functions = {} # id of each term of expr -> its Function
+        for term in logic.postorder(expr):
+            values = [functions[id(t)] for t in term.get_terms()]
+            if isinstance(term, logic.Var):
+                function = self.var(term.name)
+            elif isinstance(term, logic.Unconditional):
+                function = self.true() if term.value else self.false()
+            elif isinstance(term, logic.Not):
+                function = ~values[0]
+            elif type(term).bitwise is not None:
+                function = type(term).bitwise(self.true(), *values)
+            else:
+                nodes = [value.node for value in values]
+                function = Function(self, self.apply_rule(type(term).rule,
+                                                          *nodes))
+            functions[id(term)] = function
+        return functions[id(expr)]
+
+class Function(object):
+    """A boolean function, as a node of a BDD
+
+    Functions combine with &, |, ^ and ~, and are == when equivalent.
+    """
+
+    __slots__ = ('bdd', 'node')
+
+    def __init__(self, bdd, node):
+        self.bdd = bdd
+        self.node = node
+
+    def __and__(self, other):
+        return Function(self.bdd, self.bdd.apply(AND, self.node, other.node))
+
+    def __or__(self, other):
+        return Function(self.bdd, self.bdd.apply(OR, self.node, other.node))
+
+    def __xor__(self, other):
+        return Function(self.bdd, self.bdd.apply(XOR, self.node, other.node))
+
+    def __invert__(self):
+        return Function(self.bdd, self.bdd.apply(XOR, TRUE, self.node))
+
+    def __eq__(self, other):
+        if not isinstance(other, Function):
+            return False
+        return self.equivalent(other)
+
+    def __hash__(self):
+        return hash((id(self.bdd), self.node))
+
+    def __len__(self):
+        # the number of nodes in the diagram
+        seen, stack = set(), [self.node]
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                if node > TRUE:
+                    stack.extend((self.bdd.lows[node], self.bdd.highs[node]))
+        return len(seen)
+
+    def levels(self, names):
+        for name in names:
+            if name not in self.bdd.levels:
+                raise KeyError(name)
+        return [self.bdd.levels[name] for name in names]
+
+    def equivalent(self, other):
+        if other.bdd is not self.bdd:
+            raise ValueError('functions of different BDDs')
+        return self.node == other.node
+
+    def is_tautology(self):
+        return self.node == TRUE
+
+    def is_contradiction(self):
+        return self.node == FALSE
+
+    def evaluate(self, variables):
+        """Evaluates the function, given the value of each variable it
+        depends on, keyed by name
+        """
+        bdd, node = self.bdd, self.node
+        while node > TRUE:
+            name = bdd.names[bdd.var_levels[node]]
+            node = bdd.highs[node] if variables[name] else bdd.lows[node]
+        return node == TRUE
+
+    def restrict(self, values):
+        """Returns the function with variables fixed to values, which maps
+        variable names to True/False
+        """
+        if not values:
+            return self
+        levels = self.levels(values)
+        values = dict(zip(levels, values.values()))
+        return Function(self.bdd, self.bdd.restrict(self.node, values))
+
+    def exists(self, names):
+        """Returns the function with the variables in names quantified away"""
+        if not names:
+            return self
+        levels = frozenset(self.levels(names))
+        return Function(self.bdd, self.bdd.exists(self.node, levels))
+
+    def support(self):
+        """Returns the names of the variables the function depends on"""
+        levels, seen, stack = set(), set(), [self.node]
+        while stack:
+            node = stack.pop()
+            if node > TRUE and node not in seen:
+                seen.add(node)
+                levels.add(self.bdd.var_levels[node])
+                stack.extend((self.bdd.lows[node], self.bdd.highs[node]))
+        return [self.bdd.names[level] for level in sorted(levels)]
+
+    def count_models(self, names=None):
+        """Returns the number of assignments satisfying the function
+
+        Assignments are to the variables in names, defaulting to every
+        variable of the BDD.
+        """
+        count = self.bdd.count(self.node)
+        if names is None:
+            return count
+
+        names = set(names)
+        missing = set(self.support()) - names
+        if missing:
+            raise ValueError('the function depends on %s, which is not in names'
+                             % ', '.join(sorted(missing)))
+        extra = len(names - set(self.bdd.names))
+        unused = len(set(self.bdd.names) - names)
+        return (count << extra) >> unused
+
+def from_expression(expr, names=None):
+    """Returns the Function of expr in a new BDD
+
+    Variables are ordered as in names, then in order of appearance.
+    """
+    return BDD(names or ()).build(expr)
+
+def is_tautology(expr):
+    return from_expression(expr).is_tautology()
+
+def equivalent(expr1, expr2):
+    bdd = BDD()
+    return bdd.build(expr1).equivalent(bdd.build(expr2))
+
+def count_models(expr, names=None):
+    return from_expression(expr).count_models(names)
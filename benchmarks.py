@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+from functools import reduce
+from logic import *
+import minimise
+import random
+import sys
+import time
+
+# =============================================================================
+# Expressions
+# =============================================================================
+
+def names(prefix, n):
+    return [Var('%s%d' % (prefix, i)) for i in range(n)]
+
+def product(literals):
+    return literals[0] if len(literals) == 1 else And(*literals)
+
+def random_sum(n, products, size, seed=0):
+    """Returns a random sum of products of size literals of n variables"""
+    rand = random.Random(seed)
+    variables = names('x', n)
+    return Or(*[product([v if rand.random() < 0.5 else Not(v)
+                         for v in rand.sample(variables, size)])
+                for _ in range(products)])
+
+def multiplexer(n):
+    """Returns a multiplexer of 2**n inputs selected by n variables"""
+    select, inputs = names('s', n), names('d', 2 ** n)
+    return Or(*[product([s if i >> k & 1 else Not(s)
+                         for k, s in enumerate(select)] + [d])
+                for i, d in enumerate(inputs)])
+
+def consensus(n):
+    """Returns n sums of (x ^ y) v (~x ^ z) v (y ^ z), the last redundant"""
+    terms = []
+    for x, y, z in zip(names('x', n), names('y', n), names('z', n)):
+        terms.extend([And(x, y), And(Not(x), z), And(y, z)])
+    return Or(*terms)
+
+def comparator(n):
+    """Returns whether the n bit number x is greater than y"""
+    x, y = names('x', n), names('y', n)
+    greater = F
+    for a, b in zip(x, y):
+        # compare from the least significant bit up
+        greater = Or(And(a, Not(b)), And(Biconditional(a, b), greater))
+    return greater
+
+def parity(n):
+    return reduce(Xor, names('x', n))
+
+def wide_sum(n):
+    """Returns a flat sum of n products of two literals"""
+    return Or(*[And(x, Not(y)) for x, y in zip(names('x', n), names('y', n))])
+
+def wide_product(n):
+    """Returns a flat product of n sums of two literals"""
+    return And(*[Or(x, Not(y)) for x, y in zip(names('x', n), names('y', n))])
+
+def absorbed(n):
+    """Returns p v (p ^ x0) v (p ^ x1) ..., which rewrites to p"""
+    p = Var('p')
+    return Or(*[And(p, x) for x in names('x', n)] + [p])
+
+BENCHMARKS = [
+    ('random 6', random_sum(6, 10, 3)),
+    ('random 8', random_sum(8, 40, 3)),
+    ('random 12', random_sum(12, 30, 5)),
+    ('random 16', random_sum(16, 30, 5)),
+    ('random 20', random_sum(20, 40, 6)),
+    ('random 24', random_sum(24, 60, 8)),
+    ('random 32', random_sum(32, 80, 10)),
+    ('multiplexer 20', multiplexer(4)),
+    ('multiplexer 37', multiplexer(5)),
+    ('consensus 24', consensus(8)),
+    ('consensus 60', consensus(20)),
+    ('comparator 8', comparator(4)),
+    ('comparator 20', comparator(10)),
+    ('parity 8', parity(8)),
+    ('parity 12', parity(12)),
+]
+
+# expressions too big to simplify, timing how long rewrite takes over
+# nodes of thousands of terms
+REWRITE_BENCHMARKS = [
+    ('wide sum 4000', wide_sum(4000)),
+    ('wide product 4000', wide_product(4000)),
+    ('absorbed 4000', absorbed(4000)),
+]
+
+# =============================================================================
+# Running
+# =============================================================================
+
+def size(expr):
+    """Returns the number of variables in expr, counting repeats"""
+    if isinstance(expr, Var):
+        return 1
+    return sum(size(term) for term in expr.get_terms())
+
+def run(benchmarks):
+    print('%-16s %9s %8s %8s %10s %8s'
+          % ('expression', 'variables', 'literals', 'products', 'simplified',
+             'seconds'))
+    for name, expr in benchmarks:
+        start = time.time()
+        simple = simplify(expr)
+        seconds = time.time() - start
+        products = len(simple) if isinstance(simple, Or) else 1
+        print('%-16s %9d %8d %8d %10d %8.3f'
+              % (name, len(expr.get_names()), size(expr), products,
+                 size(simple), seconds))
+
+def run_rewrite(benchmarks):
+    print('%-18s %8s %8s' % ('expression', 'terms', 'seconds'))
+    for name, expr in benchmarks:
+        start = time.time()
+        rewrite(expr)
+        seconds = time.time() - start
+        print('%-18s %8d %8.3f' % (name, len(expr), seconds))
+
+def select(benchmarks):
+    if len(sys.argv) == 1:
+        return benchmarks
+    return [b for b in benchmarks if any(arg in b[0] for arg in sys.argv[1:])]
+
+if __name__ == '__main__':
+    print('exact up to %d variables' % minimise.EXACT_VARIABLES)
+    run(select(BENCHMARKS))
+    print()
+    run_rewrite(select(REWRITE_BENCHMARKS))
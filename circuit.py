@@ -0,0 +1,648 @@
+import heapq
+import json
+import logic
+import minimise
+from collections import OrderedDict
+
+# =============================================================================
+# Netlists
+# =============================================================================
+
+# A circuit is a netlist of nodes: inputs, constants and gates. The value of
+# each node is that of the wire leaving it, to the gates in its fan-out.
+
+class Node(object):
+    def __init__(self, value=False):
+        self.value = value
+        self.fanout = [] # the gates this node is a term of
+
+class Input(Node):
+    def __init__(self, name, value=False):
+        super(Input, self).__init__(value)
+        self.name = name
+
+class Constant(Node):
+    pass
+
+def gate_rule(op_class):
+    # the function of the values of a gate's terms giving its value
+    if op_class is logic.Not:
+        return lambda p: not p
+    return op_class.rule
+
+def gate_bitwise(op_class):
+    # as gate_rule, but for many values at once as the bits of ints
+    if op_class is logic.Not:
+        return lambda mask, p: mask ^ p
+    if op_class.bitwise is not None:
+        return op_class.bitwise
+
+    # no bitwise rule, so apply the rule to each bit
+    rule = op_class.rule
+    def bitwise(mask, *values):
+        bits = 0
+        for i in range(mask.bit_length()):
+            if rule(*[bool(value >> i & 1) for value in values]):
+                bits |= 1 << i
+        return bits
+    return bitwise
+
+def gate_classes():
+    """Returns the operation classes a gate may be, keyed by name"""
+    classes = dict((op.__name__, op) for op in logic.operations.values())
+    classes['Not'] = logic.Not
+    return classes
+
+def check_terms(op_class, count):
+    # raises TypeError unless a gate of op_class may have count terms
+    if op_class is logic.Not:
+        if count != 1:
+            raise TypeError('Not gates take 1 term (%d given)' % count)
+    elif count < 2:
+        raise TypeError('%s gates take at least 2 terms (%d given)'
+                        % (op_class.__name__, count))
+    elif op_class.two_args and count > 2:
+        raise TypeError('%s gates only take 2 terms (%d given)'
+                        % (op_class.__name__, count))
+
+class Gate(Node):
+    def __init__(self, op_class, terms):
+        super(Gate, self).__init__()
+        check_terms(op_class, len(terms))
+        self.op_class = op_class
+        self.rule = gate_rule(op_class)
+        self.bitwise = gate_bitwise(op_class)
+        self.terms = list(terms)
+        self.reevaluate()
+
+    def reevaluate(self):
+        # returns whether the value of the gate changed
+        value = bool(self.rule(*[term.value for term in self.terms]))
+        changed = value != self.value
+        self.value = value
+        return changed
+
+class Circuit(object):
+    """A netlist of gates, simulated by propagating changes in value
+
+    Gates are reevaluated in topological order, so each term is up to
+    date before the gates it feeds, and only when one of their terms
+    changed, so a change costs only its fan-out cone.
+    """
+
+    def __init__(self):
+        self.inputs = []
+        self.constants = []
+        self.gates = []
+        self.outputs = OrderedDict() # name -> node
+        self.ranks = None # gate -> its place in topological order
+
+    def __len__(self):
+        return len(self.gates)
+
+    def names(self):
+        """Returns the names of the inputs, in the order they were added
+
+        Inputs of the same name are the same variable.
+        """
+        names = []
+        for node in self.inputs:
+            if node.name not in names:
+                names.append(node.name)
+        return names
+
+    def add_input(self, name, value=False):
+        node = Input(name, value)
+        self.inputs.append(node)
+        return node
+
+    def add_constant(self, value):
+        node = Constant(bool(value))
+        self.constants.append(node)
+        return node
+
+    def add_gate(self, op_class, *terms):
+        gate = Gate(op_class, terms)
+        self.gates.append(gate)
+        for term in terms:
+            term.fanout.append(gate)
+        self.ranks = None
+        return gate
+
+    def add_output(self, name, node):
+        self.outputs[name] = node
+        return node
+
+    def extend(self, circuit):
+        """Adds the nodes and outputs of another circuit to this one"""
+        self.inputs.extend(circuit.inputs)
+        self.constants.extend(circuit.constants)
+        self.gates.extend(circuit.gates)
+        self.outputs.update(circuit.outputs)
+        self.ranks = None
+
+    def remove(self, node):
+        """Disconnects node from the circuit
+
+        Returns the gates it was a term of, which need reevaluating.
+        Raises TypeError, leaving the circuit as it was, if any of them
+        would be left with too few terms.
+        """
+        for gate in set(node.fanout):
+            count = len(gate.terms) - gate.terms.count(node)
+            check_terms(gate.op_class, count)
+
+        if isinstance(node, Gate):
+            self.gates.remove(node)
+            for term in node.terms:
+                term.fanout.remove(node)
+        elif isinstance(node, Input):
+            self.inputs.remove(node)
+        else:
+            self.constants.remove(node)
+        for name, output in list(self.outputs.items()):
+            if output is node:
+                del self.outputs[name]
+
+        fanout = node.fanout
+        for gate in fanout:
+            gate.terms.remove(node)
+        node.fanout = []
+        self.ranks = None
+        return fanout
+
+    def sweep(self):
+        """Removes the gates and constants no output depends on"""
+        live, stack = set(), list(self.outputs.values())
+        while stack:
+            node = stack.pop()
+            if node not in live:
+                live.add(node)
+                stack.extend(getattr(node, 'terms', ()))
+
+        self.constants = [node for node in self.constants if node in live]
+        self.gates = [gate for gate in self.gates if gate in live]
+        for node in self.inputs + self.constants + self.gates:
+            node.fanout = [gate for gate in node.fanout if gate in live]
+        self.ranks = None
+
+    # -------------------------------------------------------------------------
+    # Simulation
+    # -------------------------------------------------------------------------
+
+    def rank(self):
+        # number the gates so every term comes before its gates, keeping
+        # the order they were added in wherever it already does
+        self.ranks = {}
+        for gate in self.gates:
+            stack = [gate]
+            while stack:
+                g = stack[-1]
+                if g in self.ranks:
+                    stack.pop()
+                    continue
+                terms = [t for t in g.terms
+                         if isinstance(t, Gate) and t not in self.ranks]
+                if terms:
+                    stack.extend(reversed(terms))
+                    continue
+                stack.pop()
+                self.ranks[g] = len(self.ranks)
+
+    def order(self):
+        """Returns the gates in topological order"""
+        if self.ranks is None:
+            self.rank()
+        return sorted(self.gates, key=self.ranks.get)
+
+    def propagate(self, gates):
+        """Reevaluates gates, then those fed by any that change
+
+        Returns the gates whose value changed.
+        """
+        if self.ranks is None:
+            self.rank()
+
+        queue, scheduled = [], set()
+        def schedule(gates):
+            for gate in gates:
+                if gate not in scheduled:
+                    scheduled.add(gate)
+                    heapq.heappush(queue, (self.ranks[gate], gate))
+
+        schedule(gates)
+        changed = []
+        while queue:
+            _, gate = heapq.heappop(queue)
+            if gate.reevaluate():
+                changed.append(gate)
+                schedule(gate.fanout)
+        return changed
+
+    def changed(self, nodes):
+        """Propagates a change in the value of nodes, e.g. toggled inputs
+
+        Returns the gates whose value changed.
+        """
+        return self.propagate([gate for node in nodes for gate in node.fanout])
+
+    def depths(self):
+        """Returns the most gates on a path from an input to each node"""
+        depths = dict((node, 0) for node in self.inputs + self.constants)
+        for gate in self.order():
+            depths[gate] = 1 + max([0] + [depths[t] for t in gate.terms])
+        return depths
+
+    def depth(self):
+        """Returns the most gates on a path from an input to an output"""
+        depths = self.depths()
+        return max([0] + [depths[node] for node in self.outputs.values()])
+
+    def report(self):
+        """Returns the cost of the circuit, e.g. 'Gates: 5, depth: 3'"""
+        return 'Gates: %d, depth: %d' % (len(self), self.depth())
+
+    def set(self, values):
+        """Sets the inputs to values and propagates the change
+
+        Returns the inputs then the gates whose value changed. values
+        maps variable names to True/False; inputs missing from it keep
+        their value.
+        """
+        inputs = []
+        for node in self.inputs:
+            if node.name in values and node.value != bool(values[node.name]):
+                node.value = bool(values[node.name])
+                inputs.append(node)
+        return inputs + self.changed(inputs)
+
+    def simulate_bits(self, variables, mask):
+        """Returns the value of each output for many assignments at once
+
+        As Expression.evaluate_bits, bit i of each value being its value
+        in the ith assignment, and returns a dictionary of the outputs.
+        The values of the nodes are left as they are.
+        """
+        values = {} # node -> its bits
+        for node in self.inputs:
+            values[node] = variables[node.name]
+        for node in self.constants:
+            values[node] = mask if node.value else 0
+        for gate in self.order():
+            terms = [values[term] for term in gate.terms]
+            values[gate] = gate.bitwise(mask, *terms) & mask
+        return OrderedDict((name, values[node])
+                           for name, node in self.outputs.items())
+
+    def simulate(self, assignments):
+        """Returns the value of each output for each of assignments
+
+        Each assignment maps every variable name to True/False, and is
+        simulated as a bit of an int, so a batch is simulated in one pass
+        through the gates.
+        """
+        assignments = list(assignments)
+        mask = (1 << len(assignments)) - 1
+        variables = {}
+        for name in self.names():
+            variables[name] = sum(1 << i for i, a in enumerate(assignments)
+                                  if a[name])
+        outputs = self.simulate_bits(variables, mask)
+        return [OrderedDict((name, bool(bits >> i & 1))
+                            for name, bits in outputs.items())
+                for i in range(len(assignments))]
+
+    # -------------------------------------------------------------------------
+    # Expressions
+    # -------------------------------------------------------------------------
+
+    def add_expression(self, expr, name=None):
+        """Adds the gates of a logic expression, returning its node
+
+        Inputs already in the circuit are shared, as are identical terms
+        of expr, which become a single gate. If name is given, the node
+        is added as an output of that name.
+        """
+        expr = logic.intern(expr)
+        inputs = {}
+        for node in self.inputs:
+            inputs.setdefault(node.name, node)
+
+        nodes = {} # id of each term of expr -> its node
+        for term in logic.postorder(expr):
+            if isinstance(term, logic.Var):
+                if term.name not in inputs:
+                    inputs[term.name] = self.add_input(term.name)
+                node = inputs[term.name]
+            elif isinstance(term, logic.Unconditional):
+                node = self.add_constant(term.value)
+            else:
+                node = self.add_gate(type(term), *[nodes[id(t)]
+                                                   for t in term.get_terms()])
+            nodes[id(term)] = node
+
+        node = nodes[id(expr)]
+        if name is not None:
+            self.add_output(name, node)
+        return node
+
+    def expression(self, node):
+        """Returns the logic expression of the value of node"""
+        exprs = {} # node -> its expression
+        stack = [node]
+        while stack:
+            n = stack[-1]
+            if n in exprs:
+                stack.pop()
+                continue
+            terms = [t for t in getattr(n, 'terms', ()) if t not in exprs]
+            if terms:
+                stack.extend(terms)
+                continue
+            stack.pop()
+
+            if isinstance(n, Input):
+                exprs[n] = logic.Var(n.name)
+            elif isinstance(n, Constant):
+                exprs[n] = logic.T if n.value else logic.F
+            else:
+                exprs[n] = n.op_class(*[exprs[t] for t in n.terms])
+        return exprs[node]
+
+    def expressions(self):
+        """Returns the logic expression of each output, keyed by name"""
+        return OrderedDict((name, self.expression(node))
+                           for name, node in self.outputs.items())
+
+    # -------------------------------------------------------------------------
+    # Saving and Loading
+    # -------------------------------------------------------------------------
+
+    def to_json(self):
+        """Returns the netlist as JSON data
+
+        Nodes are numbered inputs first, then constants, then gates in
+        topological order, and each gate is a list of its operation's
+        name then the numbers of its terms, e.g.
+
+            {"inputs": ["p", "q"], "constants": [],
+             "gates": [["And", 0, 1], ["Not", 2]],
+             "outputs": [["out", 3]]}
+        """
+        gates = self.order()
+        nodes = self.inputs + self.constants + gates
+        numbers = dict((node, i) for i, node in enumerate(nodes))
+        return {
+            'inputs': [node.name for node in self.inputs],
+            'constants': [node.value for node in self.constants],
+            'gates': [[gate.op_class.__name__] +
+                      [numbers[term] for term in gate.terms]
+                      for gate in gates],
+            'outputs': [[name, numbers[node]]
+                        for name, node in self.outputs.items()],
+        }
+
+    def save(self, stream):
+        json.dump(self.to_json(), stream, separators=(',', ':'))
+
+# =============================================================================
+# Synthesis
+# =============================================================================
+
+# the gate giving the complement of each gate from the same terms
+COMPLEMENTS = {
+    logic.And: logic.Nand, logic.Nand: logic.And,
+    logic.Or: logic.Nor, logic.Nor: logic.Or,
+}
+
+class Synthesizer(object):
+    """Builds expressions into a circuit of And, Or, Not, Nand, Nor and Xor
+
+    Gates take at most two terms, and identical gates are shared. Gates
+    are built to have the fewest gates, or the least depth (the most
+    gates on a path from an input), as optimize is 'gates' or 'depth'.
+    """
+
+    def __init__(self, circuit, optimize='gates'):
+        if optimize not in ('gates', 'depth'):
+            raise ValueError("optimize must be 'gates' or 'depth', not %r"
+                             % (optimize,))
+        self.circuit = circuit
+        self.optimize = optimize
+        self.inputs = {} # name -> input
+        self.constants = {} # value -> constant
+        self.gates = {} # (op_class, ids of sorted terms) -> gate
+        self.depths = {} # gate -> the most gates on a path from an input
+
+    def input(self, name):
+        if name not in self.inputs:
+            self.inputs[name] = self.circuit.add_input(name)
+        return self.inputs[name]
+
+    def constant(self, value):
+        if value not in self.constants:
+            self.constants[value] = self.circuit.add_constant(value)
+        return self.constants[value]
+
+    def depth(self, node):
+        return self.depths.get(node, 0)
+
+    def gate(self, op_class, *terms):
+        # every gate used is commutative, so the order of terms is ignored
+        key = (op_class,) + tuple(sorted(id(term) for term in terms))
+        if key not in self.gates:
+            gate = self.circuit.add_gate(op_class, *terms)
+            self.depths[gate] = 1 + max(self.depth(term) for term in terms)
+            self.gates[key] = gate
+        return self.gates[key]
+
+    def negation(self, node):
+        # the node of the complement of node if it is built, else None
+        if isinstance(node, Gate):
+            if node.op_class is logic.Not:
+                return node.terms[0]
+            if node.op_class in COMPLEMENTS:
+                key = (COMPLEMENTS[node.op_class],) + tuple(
+                    sorted(id(term) for term in node.terms))
+                if key in self.gates:
+                    return self.gates[key]
+        return self.gates.get((logic.Not, id(node)))
+
+    def negate(self, node):
+        """Returns the node of the complement of node
+
+        The complement of an And, Or, Nand or Nor gate is the gate of its
+        complement, which is no deeper than the gate, rather than a Not
+        gate of it; unless optimizing gates and that Not gate is built.
+        An Xor gate is complemented by complementing a term whose
+        complement is built.
+        """
+        if isinstance(node, Constant):
+            return self.constant(not node.value)
+        if isinstance(node, Gate):
+            if node.op_class is logic.Not:
+                return node.terms[0]
+            if node.op_class in COMPLEMENTS and (
+                    self.optimize == 'depth' or
+                    (logic.Not, id(node)) not in self.gates):
+                return self.gate(COMPLEMENTS[node.op_class], *node.terms)
+            if node.op_class is logic.Xor:
+                a, b = node.terms
+                for term, other in ((a, b), (b, a)):
+                    negation = self.negation(term)
+                    if negation is not None:
+                        return self.gate(logic.Xor, negation, other)
+        return self.gate(logic.Not, node)
+
+    def negate_any(self, nodes):
+        # nodes with one complemented, the parity of which is complemented;
+        # one whose complement is built if any, else the least deep
+        for i, node in enumerate(nodes):
+            negation = self.negation(node)
+            if negation is not None:
+                break
+        else:
+            i = min(range(len(nodes)), key=lambda i: self.depth(nodes[i]))
+            negation = self.negate(nodes[i])
+        return nodes[:i] + [negation] + nodes[i + 1:]
+
+    def tree(self, op_class, nodes):
+        """Returns the node of op_class, an associative operation, of nodes
+
+        The two earliest nodes to arrive, those least deep, are combined
+        until one is left, giving the least depth for the gates. When
+        optimizing gates, pairs of nodes already combined are first
+        replaced by their gate.
+        """
+        if self.optimize == 'gates':
+            nodes = self.pair_shared(op_class, nodes)
+        queue = [(self.depth(node), i, node) for i, node in enumerate(nodes)]
+        heapq.heapify(queue)
+        count = len(queue)
+        while len(queue) > 1:
+            a = heapq.heappop(queue)[2]
+            b = heapq.heappop(queue)[2]
+            gate = self.gate(op_class, a, b)
+            heapq.heappush(queue, (self.depth(gate), count, gate))
+            count += 1
+        return queue[0][2]
+
+    def pair_shared(self, op_class, nodes):
+        # nodes with pairs of them replaced by any gate of op_class of both
+        index = dict((id(node), i) for i, node in enumerate(nodes))
+        paired, shared = set(), []
+        for i, node in enumerate(nodes):
+            if i in paired:
+                continue
+            for gate in node.fanout:
+                if gate.op_class is not op_class or len(gate.terms) != 2:
+                    continue
+                a, b = gate.terms
+                j = index.get(id(b if a is node else a))
+                if j is not None and j != i and j not in paired:
+                    paired.update((i, j))
+                    shared.append(gate)
+                    break
+        return [n for i, n in enumerate(nodes) if i not in paired] + shared
+
+    def combine(self, expr, nodes):
+        """Returns the node of expr, given the nodes of its terms"""
+        if isinstance(expr, logic.Unconditional):
+            return self.constant(expr.value)
+        op_class = type(expr)
+        if op_class is logic.Not:
+            return self.negate(nodes[0])
+        if op_class in (logic.And, logic.Or):
+            return self.tree(op_class, nodes)
+        if op_class in (logic.Nand, logic.Nor):
+            return self.negate(self.tree(COMPLEMENTS[op_class], nodes))
+        if op_class is logic.Xor:
+            return self.gate(logic.Xor, *nodes)
+        if op_class is logic.Biconditional:
+            # a chain of n biconditionals is n xors, negated if n is odd
+            if len(nodes) % 2 == 0:
+                nodes = self.negate_any(nodes)
+            return self.tree(logic.Xor, nodes)
+        if op_class is logic.Conditional:
+            return self.gate(logic.Or, self.negate(nodes[0]), nodes[1])
+
+        # any other operation is built from its minimum sum of products
+        names = ['t%d' % i for i in range(len(nodes))]
+        expr = minimise.minimise(op_class(*map(logic.Var, names)))
+        return self.build(expr, dict(zip(names, nodes)))
+
+    def build(self, expr, variables=None):
+        """Returns the node of expr, building any gates needed
+
+        Variables are the inputs of their names, or the nodes given for
+        them in variables.
+        """
+        expr = logic.intern(expr)
+        nodes = {} # id of each term of expr -> its node
+        for term in logic.postorder(expr):
+            if isinstance(term, logic.Var):
+                if variables is None:
+                    node = self.input(term.name)
+                else:
+                    node = variables[term.name]
+            else:
+                node = self.combine(term, [nodes[id(t)]
+                                           for t in term.get_terms()])
+            nodes[id(term)] = node
+        return nodes[id(expr)]
+
+def synthesize(expr, optimize='gates', name='out'):
+    """Returns a circuit of expr, with its value as the output name
+
+    The circuit is of And, Or, Not, Nand, Nor and Xor gates of at most
+    two terms, with identical terms built once. optimize is 'gates' to
+    build it with the fewest gates or 'depth' to keep the longest path
+    through it short (see Synthesizer); report() gives both.
+
+    E.g. synthesize('(p ^ q) -> r').report()  gives  'Gates: 2, depth: 2'
+    """
+    circuit = Circuit()
+    synthesizer = Synthesizer(circuit, optimize)
+    node = synthesizer.build(logic.rewrite(logic.parse(expr)))
+    circuit.add_output(name, node)
+    circuit.sweep()
+    return circuit
+
+def from_expression(expr, name='out'):
+    """Returns a circuit of expr, with its value as the output name"""
+    circuit = Circuit()
+    circuit.add_expression(expr, name)
+    return circuit
+
+def from_json(data):
+    """Returns the circuit of JSON data (see Circuit.to_json)
+
+    Raises ValueError if data is not a valid netlist.
+    """
+    circuit = Circuit()
+    nodes = [circuit.add_input(name) for name in data.get('inputs', [])]
+    nodes += [circuit.add_constant(value)
+              for value in data.get('constants', [])]
+
+    def node(number):
+        # gates may only have earlier nodes as terms, so there are no cycles
+        if not isinstance(number, int) or not 0 <= number < len(nodes):
+            raise ValueError('no node %r' % (number,))
+        return nodes[number]
+
+    classes = gate_classes()
+    for gate in data.get('gates', []):
+        if not gate or gate[0] not in classes:
+            raise ValueError('unknown gate %r' % (gate[:1],))
+        terms = [node(number) for number in gate[1:]]
+        try:
+            nodes.append(circuit.add_gate(classes[gate[0]], *terms))
+        except TypeError as e:
+            raise ValueError(str(e))
+
+    for name, number in data.get('outputs', []):
+        circuit.add_output(name, node(number))
+    return circuit
+
+def load(stream):
+    return from_json(json.load(stream))
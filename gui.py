@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 
 from Tkinter import *
+import tkFont
 import tkMessageBox
 import tkSimpleDialog
+import circuit
 import logic
 import math
+import prettytable
+import threading
 
 def error(message):
     tkMessageBox.showerror(message=message)
@@ -68,6 +72,7 @@ class ButtonRowFrame(Frame):
         self.app.main_frame.pack_forget()
 
         if self.mode == TRUTH_TABLE:
+            self.app.main_frame.cancel()
             self.app.main_frame = CircuitBuilder(self.app)
             self.mode = CIRCUIT_BUILDER
         else:
@@ -79,17 +84,31 @@ class ButtonRowFrame(Frame):
 
 VARIABLE_DIMENSIONS = (120, 80)
 OPERATION_DIMENSIONS = (60, 40)
+# the spacing of the columns and rows of a circuit laid out by depth
+LAYOUT_SPACING = (180, 100)
 
 def distance(p1, p2):
     x1, y1 = p1
     x2, y2 = p2
     return math.sqrt((x2-x1)**2 + (y2-y1)**2)
 
+def sides(item):
+    # the midpoints of the sides of item's rectangle
+    width, height = item.dimensions
+    x, y = item.x, item.y
+    return ((x, y+height/2), (x, y-height/2), (x+width/2, y), (x-width/2, y))
+
+def connector(term, operation):
+    # the shortest line from a side of term to a side of operation
+    return min(((t, o) for t in sides(term) for o in sides(operation)),
+               key=lambda line: distance(*line))
+
 class CircuitItem(object):
-    def __init__(self, x, y, item_id, label_id):
+    # the view of a node of the circuit (see circuit.py)
+    def __init__(self, x, y, item_id, label_id, node):
         self.x = x
         self.y = y
-        self.on = True
+        self.node = node
         self.item_id = item_id
         self.label_id = label_id
         self.selected = True
@@ -99,7 +118,7 @@ class CircuitItem(object):
         self.y += dy
 
     def get_fill(self):
-        if self.on:
+        if self.node.value:
             fill = 'springgreen3' if self.selected else 'springgreen2'
         else:
             fill = 'firebrick3' if self.selected else 'firebrick2'
@@ -112,23 +131,14 @@ class CircuitItem(object):
         return (self.get_fill(), self.get_outline())
 
 class CircuitOperation(CircuitItem):
-    def __init__(self, x, y, item_id, label_id, op_class, *variables):
-        super(CircuitOperation, self).__init__(x, y, item_id, label_id)
-        self.op_class = op_class
-        self.variables = variables
-        self.reevaluate()
-
-    def reevaluate(self):
-        terms = map(lambda i: (logic.F, logic.T)[i.on], self.variables)
-        self.on = self.op_class(*terms).evaluate({})
+    dimensions = OPERATION_DIMENSIONS
 
 class CircuitVariable(CircuitItem):
-    def __init__(self, x, y, item_id, label_id, name):
-        super(CircuitVariable, self).__init__(x, y, item_id, label_id)
-        self.name = name
+    dimensions = VARIABLE_DIMENSIONS
 
-    def toggle(self):
-        self.on = not self.on
+    @property
+    def name(self):
+        return self.node.name
 
 class CircuitCanvasFrame(Frame):
     def __init__(self, parent, app, **kwargs):
@@ -138,11 +148,13 @@ class CircuitCanvasFrame(Frame):
         self.canvas.bind('<ButtonRelease-1>', self.button_1_release)
         self.canvas.bind('<B1-Motion>', self.button_1_motion)
         self.canvas.pack(fill=BOTH, expand=True)
-        self.operations = []
+        self.circuit = circuit.Circuit()
+        self.nodes = {} # node of the circuit -> its item
         self.items = []
+        self.item_ids = {} # canvas ID of each item's rectangle -> item
         self.down = False
         self.item_id = None
-        self.line_ids = []
+        self.lines = {} # (term, operation) -> canvas ID of the line between
 
     def move(self, item_id, dx, dy):
         item = self.get_item(item_id)
@@ -168,10 +180,12 @@ class CircuitCanvasFrame(Frame):
 
         if self.item_id:
             self.move(self.item_id, dx, dy)
+            self.draw_lines(self.get_item())
         else:
+            # everything moves together, lines included
             for item in self.items:
-                self.move(item.item_id, dx, dy)
-        self.draw_lines()
+                item.move(dx, dy)
+            self.canvas.move(ALL, dx, dy)
 
     def button_1_release(self, event):
         if self.down:
@@ -195,10 +209,7 @@ class CircuitCanvasFrame(Frame):
         # return LogicItem object corresponding to item with ID of `item_id`
         if item_id is None:
             item_id = self.item_id
-        for item in self.items:
-            if item.item_id == item_id:
-                return item
-        return None
+        return self.item_ids.get(item_id)
 
     def update_item(self, item):
         if isinstance(item, int):
@@ -218,9 +229,12 @@ class CircuitCanvasFrame(Frame):
         item.selected = False
         self.update_item(item)
 
-    def add_item(self, label, dimensions):
-        # place items in the center of the canvas
-        x, y = self.canvas.winfo_width()/2, self.canvas.winfo_height()/2
+    def add_item(self, label, dimensions, position=None):
+        # place items in the center of the canvas, unless given a position
+        if position is None:
+            x, y = self.canvas.winfo_width()/2, self.canvas.winfo_height()/2
+        else:
+            x, y = position
 
         width, height = dimensions
         x1 = x - width/2
@@ -232,10 +246,57 @@ class CircuitCanvasFrame(Frame):
         label_id = self.canvas.create_text(x, y, anchor=CENTER, text=label)
         return (x, y, item_id, label_id)
 
+    def input_value(self, name):
+        # inputs of the same name are the same variable, so a new one takes
+        # the value of those already on the canvas, or is true if none are
+        for node in self.circuit.inputs:
+            if node.name == name:
+                return node.value
+        return True
+
     def add_variable(self, name):
         x, y, item_id, label_id = self.add_item(name, VARIABLE_DIMENSIONS)
-        self.items.append(CircuitVariable(x, y, item_id, label_id, name))
-        self.update_item(item_id)
+        node = self.circuit.add_input(name, self.input_value(name))
+        variable = CircuitVariable(x, y, item_id, label_id, node)
+        self.nodes[node] = variable
+        self.items.append(variable)
+        self.item_ids[item_id] = variable
+        self.update_item(variable)
+
+    def add_circuit(self, netlist):
+        # lay out the nodes of netlist in columns by depth, inputs leftmost
+        if netlist.constants:
+            value = netlist.constants[0].value
+            return error('That expression is always %s'
+                         % ('true' if value else 'false'))
+        netlist.set(dict((name, self.input_value(name))
+                         for name in netlist.names()))
+        self.circuit.extend(netlist)
+
+        depths = netlist.depths()
+        rows = {} # depth -> the number of nodes laid out at that depth
+        spacing_x, spacing_y = LAYOUT_SPACING
+        for node in netlist.inputs + netlist.order():
+            depth = depths[node]
+            rows[depth] = rows.get(depth, 0) + 1
+            position = (spacing_x * (depth + 1), spacing_y * rows[depth])
+            if isinstance(node, circuit.Input):
+                x, y, item_id, label_id = self.add_item(
+                    node.name, VARIABLE_DIMENSIONS, position)
+                item = CircuitVariable(x, y, item_id, label_id, node)
+            else:
+                x, y, item_id, label_id = self.add_item(
+                    node.op_class.__name__.upper(), OPERATION_DIMENSIONS,
+                    position)
+                item = CircuitOperation(x, y, item_id, label_id, node)
+            item.selected = False
+            self.nodes[node] = item
+            self.items.append(item)
+            self.item_ids[item_id] = item
+            self.update_item(item)
+
+        for gate in netlist.gates:
+            self.draw_lines(self.nodes[gate])
 
     def add_operation(self, op_class, name=None):
         name = name if name else op_class.__name__
@@ -257,60 +318,34 @@ class CircuitCanvasFrame(Frame):
             self.deselect(item)
 
         x, y, item_id, label_id = self.add_item(name.upper(), OPERATION_DIMENSIONS)
-        operation = CircuitOperation(x, y, item_id, label_id, op_class, *variables)
+        gate = self.circuit.add_gate(op_class, *[v.node for v in variables])
+        operation = CircuitOperation(x, y, item_id, label_id, gate)
         self.items.append(operation)
-        self.operations.append((operation, variables))
+        self.item_ids[item_id] = operation
+        self.nodes[gate] = operation
         self.update_item(operation)
-        self.draw_lines()
-
-    def draw_lines(self):
-        # remove all lines
-        while self.line_ids:
-            self.canvas.delete(self.line_ids.pop())
-
-        # draw shortest line between each of the variables in each operation
-        for operation, variables in self.operations:
-            for variable in variables:
-                vw, vh = VARIABLE_DIMENSIONS if isinstance(variable, CircuitVariable) else OPERATION_DIMENSIONS
-                vw_half, vh_half = vw/2, vh/2
-
-                ow, oh = OPERATION_DIMENSIONS
-                ow_half, oh_half = ow/2, oh/2
-
-                vx, vy = variable.x, variable.y
-                ox, oy = operation.x, operation.y
-
-                v_points = ((vx, vy+vh_half),
-                            (vx, vy-vh_half),
-                            (vx+vw_half, vy),
-                            (vx-vw_half, vy))
-
-                o_points = ((ox, oy+oh_half),
-                            (ox, oy-oh_half),
-                            (ox+ow_half, oy),
-                            (ox-ow_half, oy))
-
-                dist = distance(v_points[0], o_points[0])
-                line = (v_points[0], o_points[0])
-                for v_point in v_points:
-                    for o_point in o_points:
-                        if distance(v_point, o_point) < dist:
-                            dist = distance(v_point, o_point)
-                            line = (v_point, o_point)
-
-                line_id = self.canvas.create_line(line[0][0], line[0][1],
-                                                  line[1][0], line[1][1],
-                                                  arrow=LAST)
-                self.line_ids.append(line_id)
-
-    def reevaluate(self):
-        # reevaluate each operation
-        for op, _ in self.operations:
-            op.reevaluate()
-            self.update_item(op)
+        self.draw_lines(operation)
+
+    def edges(self, item):
+        # the (term, operation) pairs of the lines touching item
+        edges = [(item, self.nodes[gate]) for gate in item.node.fanout]
+        if isinstance(item, CircuitOperation):
+            edges.extend((self.nodes[term], item) for term in item.node.terms)
+        return edges
+
+    def draw_lines(self, item):
+        # draw the lines touching item, moving those already drawn
+        for term, operation in self.edges(item):
+            (x1, y1), (x2, y2) = connector(term, operation)
+            line_id = self.lines.get((term, operation))
+            if line_id is None:
+                line_id = self.canvas.create_line(x1, y1, x2, y2, arrow=LAST)
+                self.lines[(term, operation)] = line_id
+            else:
+                self.canvas.coords(line_id, x1, y1, x2, y2)
 
     def toggle(self):
-        names = []
+        values = {} # name of each variable toggled -> its new value
         for item in self.items:
             # don't toggle operations
             if isinstance(item, CircuitOperation):
@@ -320,48 +355,48 @@ class CircuitCanvasFrame(Frame):
 
             # toggle selected items
             if item.selected:
-                if item.name not in names:
-                    names.append(item.name)
+                values.setdefault(item.name, not item.node.value)
 
-        for item in self.items:
-            if isinstance(item, CircuitVariable) and item.name in names:
-                item.toggle()
-                self.update_item(item)
+        # set every input of each name, so inputs of the same name agree
+        toggled = [node for node in self.circuit.inputs
+                   if node.name in values and node.value != values[node.name]]
+        for node in toggled:
+            node.value = values[node.name]
 
-        # reevaluate everything (this is lazy)
-        self.reevaluate()
+        # reevaluate only the operations the toggled variables feed
+        for node in toggled + self.circuit.changed(toggled):
+            self.update_item(self.nodes[node])
 
     def remove(self):
-        for item in self.items:
+        for item in list(self.items):
             # only removing items we've selected
             if not item.selected:
                 continue
 
-            for op, variables in self.operations:
-                if item in variables and len(variables) <= 2:
-                    if isinstance(item, CircuitVariable):
-                        item_noun = "The variable '%s'" % item.name
-                    else:
-                        item_noun = 'That operation'
-                    error('%s is part of an expression that cannot be reduced'
-                              % item_noun)
-                    break
-
-            # haven't encountered any conflicts
-            else:
-                self.items.remove(item)
-                for i, (op, variables) in enumerate(self.operations):
-                    if item in variables:
-                        variables.remove(item)
-                    if op is item:
-                        self.operations.pop(i)
+            # the circuit refuses to leave a gate with too few terms
+            edges = self.edges(item)
+            try:
+                fanout = self.circuit.remove(item.node)
+            except TypeError:
+                if isinstance(item, CircuitVariable):
+                    item_noun = "The variable '%s'" % item.name
+                else:
+                    item_noun = 'That operation'
+                error('%s is part of an expression that cannot be reduced'
+                          % item_noun)
+                continue
 
-                # clear the rectangle and text from the canvas
-                self.canvas.delete(item.item_id)
-                self.canvas.delete(item.label_id)
+            self.items.remove(item)
+            del self.item_ids[item.item_id]
+            for edge in edges:
+                self.canvas.delete(self.lines.pop(edge))
+            del self.nodes[item.node]
+            for gate in self.circuit.propagate(fanout):
+                self.update_item(self.nodes[gate])
 
-        # redraw the lines (lazy again, just removing now-obsolete lines)
-        self.draw_lines()
+            # clear the rectangle and text from the canvas
+            self.canvas.delete(item.item_id)
+            self.canvas.delete(item.label_id)
 
 class CircuitButtons(Frame):
     def __init__(self, parent, app, **kwargs):
@@ -377,6 +412,7 @@ class CircuitButtons(Frame):
         Button(self, text='Add Variable', command=self.add_variable).pack(side=LEFT)
         Button(self, text='On/Off', command=parent.canvas_frame.toggle).pack(side=LEFT)
         Button(self, text='Remove', command=parent.canvas_frame.remove).pack(side=LEFT)
+        Button(self, text='Synthesize', command=self.synthesize).pack(side=LEFT)
         Button(self, text='XNOR', command=command(logic.Biconditional, 'Xnor')).pack(side=RIGHT)
         Button(self, text='NOR', command=command(logic.Nor)).pack(side=RIGHT)
         Button(self, text='NAND', command=command(logic.Nand)).pack(side=RIGHT)
@@ -394,6 +430,16 @@ class CircuitButtons(Frame):
         else:
             error('Invalid variable name')
 
+    def synthesize(self):
+        expr = tkSimpleDialog.askstring('Synthesize', 'Expression to build:')
+        if expr is None:
+            return
+        try:
+            netlist = circuit.synthesize(expr)
+        except SyntaxError as e:
+            return error('Syntax error: ' + str(e))
+        self.parent.canvas_frame.add_circuit(netlist)
+
 class CircuitBuilder(Frame):
     def __init__(self, app, **kwargs):
         Frame.__init__(self, app, **kwargs)
@@ -402,6 +448,12 @@ class CircuitBuilder(Frame):
         self.canvas_frame.pack(fill=BOTH, expand=True)
         CircuitButtons(self, app).pack(fill=X, pady=(10, 0))
 
+# the largest truth table shown, rather than summarised
+MAX_TABLE_ROWS = 2 ** 24
+
+# the milliseconds between checks on a truth table being computed
+POLL_INTERVAL = 50
+
 class ControlFrame(Frame):
     def __init__(self, parent, app, **kwargs):
         Frame.__init__(self, parent, **kwargs)
@@ -417,30 +469,225 @@ class ControlFrame(Frame):
 
     def evaluate(self, event=None):
         try:
-            tt = str(logic.truth_table(self.expr.get()))
-            self.parent.output(tt)
-        except logic.TooManyVariablesError as e:
-            error('Cannot generate truth table: ' + str(e))
+            expr = logic.parse(self.expr.get())
+            rows, _ = logic.estimate_truth_table(expr)
+            # too big to show, so summarise the table instead
+            self.parent.compute(expr, summarise=rows > MAX_TABLE_ROWS)
         except SyntaxError as e:
             error('Syntax error: ' + str(e))
         self.expr_entry.select_range(0, END)
 
+class TruthTableWorker(threading.Thread):
+    """Computes the truth table of an expression on a thread of its own
+
+    The table is computed a block of rows at a time (see
+    logic.iter_truth_bits), so that its progress can be read and it can
+    be cancelled between blocks. When finished, table is the TruthTable,
+    or error is the exception raised computing it.
+
+    If summarise is true, the table is summarised instead (see
+    logic.summarise), and when finished summary is the lines of it.
+    """
+
+    def __init__(self, expr, summarise=False):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.expr = expr
+        self.summarise = summarise
+        self.lock = threading.Lock()
+        self.rows = 2 ** len(expr.get_names())
+        self.rows_done = 0
+        self.cancelled = False
+        self.finished = False
+        self.table = None
+        self.summary = None
+        self.error = None
+
+    def run(self):
+        try:
+            if self.summarise:
+                summary = logic.summarise(self.expr)
+                with self.lock:
+                    self.summary = summary
+            else:
+                column = logic.column_of_blocks(self.blocks())
+                table = None
+                if not self.cancelled:
+                    table = logic.TruthTable(self.expr, column)
+                with self.lock:
+                    self.table = table
+        except Exception as e:
+            with self.lock:
+                self.error = e
+        with self.lock:
+            self.finished = True
+
+    def blocks(self):
+        # the blocks of the table, stopping early if cancelled
+        for bits, mask in logic.iter_truth_bits(self.expr):
+            if self.cancelled:
+                return
+            yield bits, mask
+            with self.lock:
+                self.rows_done += mask.bit_length()
+
+    def progress(self):
+        # the fraction of the rows computed, or None if summarising
+        if self.summarise:
+            return None
+        with self.lock:
+            return float(self.rows_done) / self.rows
+
+    def cancel(self):
+        self.cancelled = True
+
+class TruthTableView(Frame):
+    """Shows a truth table, formatting only the rows scrolled into view
+
+    Rows are read from TruthTable.rows as they are needed, so a table of
+    millions of rows scrolls as quickly as one of a few.
+    """
+
+    def __init__(self, parent, **kwargs):
+        Frame.__init__(self, parent, **kwargs)
+        self.table = None
+        self.top = 0 # the index of the first row in view
+        self.font = tkFont.Font(family='Courier', size=16)
+        self.text = StringVar()
+        self.scrollbar = Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
+        self.label = Label(self, textvariable=self.text, font=self.font,
+                           anchor=N)
+        self.label.pack(side=LEFT, fill=BOTH, expand=True)
+        self.label.bind('<Configure>', lambda event: self.render())
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.label.bind(sequence, self.wheel)
+
+    def visible_rows(self):
+        # the rows fitting in the label with the header and 3 borders
+        lines = self.label.winfo_height() // self.font.metrics('linespace')
+        return max(lines - 4, 1)
+
+    def show(self, table):
+        self.table = table
+        self.top = 0
+        self.render()
+
+    def show_text(self, text):
+        self.table = None
+        self.text.set(text)
+        self.scrollbar.set(0, 1)
+
+    def scroll(self, top):
+        if self.table is None:
+            return
+        last = len(self.table.rows) - self.visible_rows()
+        self.top = max(0, min(top, last))
+        self.render()
+
+    def yview(self, *args):
+        # called by the scrollbar with ('moveto', fraction) or
+        # ('scroll', steps, 'units' or 'pages')
+        if self.table is None:
+            return
+        if args[0] == 'moveto':
+            self.scroll(int(float(args[1]) * len(self.table.rows)))
+        elif args[0] == 'scroll':
+            steps = int(args[1])
+            if args[2] == 'pages':
+                steps *= self.visible_rows()
+            self.scroll(self.top + steps)
+
+    def wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll(self.top - 3)
+        else:
+            self.scroll(self.top + 3)
+
+    def render(self):
+        table = self.table
+        if table is None:
+            return
+        rows = table.rows[self.top:self.top + self.visible_rows()]
+        lines = [table.render_border(prettytable.TOP),
+                 table.render_row(table.pad_cells(table.header)),
+                 table.render_border(prettytable.MIDDLE)]
+        lines.extend(table.render_row(table.pad_cells(row)) for row in rows)
+        lines.append(table.render_border(prettytable.BOTTOM))
+        self.text.set(''.join(lines))
+
+        total = float(len(table.rows))
+        self.scrollbar.set(self.top / total, (self.top + len(rows)) / total)
+
 class OutputFrame(Frame):
     def __init__(self, parent, app, **kwargs):
         Frame.__init__(self, parent, **kwargs)
         self.app = app
-        self.output = StringVar()
-        Label(self, textvariable=self.output, font=('Courier', 16)).pack()
+        self.status = StringVar()
+        status_frame = Frame(self)
+        Label(status_frame, textvariable=self.status).pack(side=LEFT)
+        self.cancel_button = Button(status_frame, text='Cancel',
+                                    command=parent.cancel)
+        status_frame.pack(fill=X)
+        self.view = TruthTableView(self)
+        self.view.pack(fill=BOTH, expand=True)
+
+    def progress(self, fraction):
+        if fraction is None:
+            self.status.set('Summarising truth table...')
+        else:
+            self.status.set('Computing truth table... %d%%' % (fraction * 100))
+        self.cancel_button.pack(side=RIGHT)
+
+    def finish(self, status=''):
+        self.status.set(status)
+        self.cancel_button.pack_forget()
 
 class TruthTableFrame(Frame):
     def __init__(self, app, **kwargs):
         Frame.__init__(self, app, **kwargs)
+        self.worker = None
         ControlFrame(self, app).pack(pady=20)
         self.output_frame = OutputFrame(self, app)
-        self.output_frame.pack()
+        self.output_frame.pack(fill=BOTH, expand=True)
 
     def output(self, output):
-        self.output_frame.output.set(output)
+        self.cancel()
+        self.output_frame.finish()
+        self.output_frame.view.show_text(output)
+
+    def compute(self, expr, summarise=False):
+        # compute the truth table of expr in the background, then show it,
+        # or show a summary of it if summarise is true
+        self.cancel()
+        self.worker = TruthTableWorker(expr, summarise)
+        self.worker.start()
+        self.output_frame.progress(self.worker.progress())
+        self.after(POLL_INTERVAL, self.poll, self.worker)
+
+    def poll(self, worker):
+        if worker is not self.worker:
+            # cancelled, or replaced by another worker
+            return
+        if not worker.finished:
+            self.output_frame.progress(worker.progress())
+            self.after(POLL_INTERVAL, self.poll, worker)
+            return
+
+        self.worker = None
+        self.output_frame.finish()
+        if worker.error is not None:
+            error('Error computing truth table: ' + str(worker.error))
+        elif worker.summary is not None:
+            self.output_frame.view.show_text('\n'.join(worker.summary))
+        else:
+            self.output_frame.view.show(worker.table)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+            self.output_frame.finish('Cancelled')
 
 class App(Frame):
     def __init__(self, root):
@@ -460,7 +707,7 @@ class App(Frame):
 
         ButtonRowFrame(self).pack(fill=X)
         self.main_frame = TruthTableFrame(self)
-        self.main_frame.pack()
+        self.main_frame.pack(fill=BOTH, expand=True)
 
     def exit(self):
         self.root.destroy()
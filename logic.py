@@ -1,10 +1,21 @@
 #!/usr/bin/env python
 
+import io
+import itertools
 import prettytable
 import re
+import sat
 import sys
+import warnings
+import weakref
+from collections import Counter, OrderedDict, defaultdict
 from functools import reduce
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # =============================================================================
 # Parser
 # =============================================================================
@@ -31,66 +42,172 @@ def parse(expr):
         return expr
     if isinstance(expr, str):
         expr = tokenize(expr)
+    if parse_cache is not None:
+        return parse_cache.parse(expr)
     return Parser(expr).parse()
 
+not_tokens = ('~', '!', u'\u00ac')
+
+class ParseCache(object):
+    """Caches parsed expressions, evicting the least recently used
+
+    Expressions are keyed on their tokens, with symbols for the same
+    operation (e.g. `^` and `&`) treated alike. As every hit returns the
+    same expression, cached expressions are frozen.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, tokens):
+        key = []
+        for token in tokens:
+            if token in not_tokens:
+                key.append('~')
+            elif not isvar(token) and get_operation(token) is not None:
+                # words can be variables too, so only symbols are merged
+                key.append(get_operation(token))
+            else:
+                key.append(token)
+        return tuple(key)
+
+    def parse(self, tokens):
+        key = self.key(tokens)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        expr = Parser(tokens).parse().freeze()
+        self.entries[key] = expr
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return expr
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self),
+                'maxsize': self.maxsize}
+
+parse_cache = None
+
+def enable_parse_cache(maxsize=128):
+    """Caches the maxsize most recently parsed expressions, see ParseCache"""
+    global parse_cache
+    parse_cache = ParseCache(maxsize)
+    return parse_cache
+
+def disable_parse_cache():
+    global parse_cache
+    parse_cache = None
+
 class Parser(object):
+    """Parses a list of tokens into an expression
+
+    Operations are collected on a stack, so each token is read once and
+    the depth of brackets is limited only by memory.
+    """
+
     def __init__(self, tokens):
         self.tokens = tokens
-        self.terms = []
+        self.index = 0
 
     def read(self):
-        # consume first token
-        if self.tokens:
-            return self.tokens.pop(0)
+        # consume next token
+        if self.index < len(self.tokens):
+            self.index += 1
+            return self.tokens[self.index - 1]
         return None
 
-    def parse(self, max_precedence=None):
-        op = None
+    def unclosed(self):
+        # indices of the opening brackets that are never closed
+        opened = []
+        for i, token in enumerate(self.tokens):
+            if token == '(':
+                opened.append(i)
+            elif token == ')' and opened:
+                opened.pop()
+        return set(opened)
+
+    def parse(self):
+        unclosed = self.unclosed()
+        terms = []
+        # operations as [operation, number of terms], and brackets
+        # as [None, number of preceding nots]
+        ops = []
+        depth = 0
 
         while True:
-            toks = list(self.tokens)
-            term = self.next_term()
             token = self.read()
+            nots = 0
+            while token in not_tokens:
+                nots += 1
+                token = self.read()
+
+            # open bracket
+            if token == '(':
+                if self.index - 1 in unclosed:
+                    # depth did not return to 1, therefore not enough ')'
+                    expected('an operation or `)`')
+                ops.append([None, nots])
+                depth += 1
+                continue
+
+            term = self.next_term(token, depth)
+            for _ in range(nots):
+                term = Not(term)
+            terms.append(term)
+
+            # close brackets
+            token = self.read()
+            while token == ')' and depth:
+                while ops[-1][0] is not None:
+                    self.reduce(terms, ops)
+                term = terms.pop()
+                for _ in range(ops.pop()[1]):
+                    term = Not(term)
+                terms.append(term)
+                depth -= 1
+                token = self.read()
 
             if token is None:
-                if op is None:
-                    return term
-                self.terms.append(term)
-                return op(*self.terms)
+                while ops:
+                    self.reduce(terms, ops)
+                return terms[0]
 
-            next_op = get_operation(token)
+            op = get_operation(token)
 
             # token is not None, but no operation found either
-            if next_op is None:
+            if op is None:
                 expected('an operation or EOE', token)
 
-            # consumed beyond the maximum precedence (if specified
-            if max_precedence and next_op.precedence >= max_precedence:
-                self.tokens.insert(0, token) # put the token back
-                self.terms.append(term)
-                return op(*self.terms)
-
-            # already looped through and undergoing an operation
-            if op and op.precedence > next_op.precedence:
-                p = Parser(toks)
-                self.terms.append(p.parse(op.precedence))
-                self.tokens = p.tokens
-                if not self.tokens:
-                    return op(*self.terms)
-                next_op = get_operation(self.read())
-                if op is not next_op:
-                    self.terms = [op(*self.terms)]
+            # apply the operations that bind at least as tightly
+            while ops and ops[-1][0] is not None and \
+                  ops[-1][0] is not op and ops[-1][0].precedence <= op.precedence:
+                self.reduce(terms, ops)
 
+            if ops and ops[-1][0] is op:
+                ops[-1][1] += 1
             else:
-                self.terms.append(term)
-                if op and op is not next_op:
-                    self.terms = [op(*self.terms)]
+                ops.append([op, 2])
 
-            op = next_op
-
-    def next_term(self):
-        token = self.read()
+    def reduce(self, terms, ops):
+        # apply the operation on top of the stack to its terms
+        op, count = ops.pop()
+        term = op(*terms[-count:])
+        del terms[-count:]
+        terms.append(term)
 
+    def next_term(self, token, depth=0):
         # unconditionals
         if token == 'T':
             return T
@@ -101,29 +218,11 @@ class Parser(object):
         if isvar(token):
             return Var(token)
 
-        # Not character
-        if token in ('~', '!') or token == u'\u00ac':
-            return Not(self.next_term())
-
-        # open bracket
-        if token == '(':
-            toks, depth = [], 1
-            while self.tokens:
-                tok = self.read()
-                if tok == '(':
-                    depth += 1
-                elif tok == ')':
-                    if depth == 1:
-                        break
-                    depth -= 1
-                toks.append(tok)
-            else:
-                # depth did not return to 1, therefore not enough ')'
-                expected('an operation or `)`')
-
-            return parse(toks)
+        # a closing bracket ends the expression within the brackets
+        if token == ')' and depth:
+            token = None
 
-        # no other valid characters left! (note, ')' will be consumed as above)
+        # no other valid characters left! (note, '~' and '(' are read first)
         expected('a variable, unconditional, `~`, or `(`', token)
 
 # =============================================================================
@@ -131,10 +230,46 @@ class Parser(object):
 # =============================================================================
 
 class Expression(object):
+    __slots__ = ('frozen', 'interned', 'hash_value', '__weakref__')
+
+    def __init__(self):
+        self.frozen = False
+        self.interned = False
+        self.hash_value = None
+
     def __eq__(self, expr):
+        """Returns bool as to whether the expression is identical to expr
+
+        Note: compares structure, like identical and hash; see equivalent
+        to compare meaning, e.g. p and ~~p are equivalent but not equal
+        """
         if not isinstance(expr, Expression):
             return False
-        return self.equivalent(expr)
+        return self.identical(expr)
+
+    def __hash__(self):
+        """Hashes the structure of the expression
+
+        Note: identical expressions hash alike, equivalent ones may not
+        """
+        if self.hash_value is not None:
+            return self.hash_value
+
+        # hash each term before the terms made of it
+        hashes = {} # id of each unfrozen term -> its hash
+        def known(term):
+            if term.hash_value is not None:
+                return term.hash_value
+            return hashes.get(id(term))
+
+        for expr in postorder(self, lambda t: t.hash_value is not None):
+            value = hash((type(expr), expr.label()) +
+                         tuple(map(known, expr.get_terms())))
+            if expr.frozen:
+                expr.hash_value = value
+            else:
+                hashes[id(expr)] = value
+        return known(self)
 
     def __len__(self):
         raise NotImplementedError
@@ -145,40 +280,243 @@ class Expression(object):
     def get_names(self):
         raise NotImplementedError
 
+    def get_terms(self):
+        """Returns the expressions the expression is made of"""
+        return []
+
+    def label(self):
+        """Returns what distinguishes the expression besides its terms"""
+        return None
+
+    def with_terms(self, terms):
+        """Returns an expression like this one, but made of terms"""
+        return self
+
+    def freeze(self):
+        """Prevents the expression and its terms changing, returning it"""
+        stack = [self]
+        while stack:
+            expr = stack.pop()
+            if not expr.frozen:
+                expr.frozen = True
+                stack.extend(expr.get_terms())
+        return self
+
+    def count_models(self, names=None):
+        """Returns the number of assignments under which the expression is true
+
+        The assignments are to names, which defaults to get_names() and
+        may include variables not in the expression. Models are counted
+        on a binary decision diagram rather than a truth table.
+        """
+        import bdd # bdd imports logic
+        return bdd.count_models(self, names)
+
+    def counterexample(self, expr=None):
+        """Returns an assignment under which the expression is false
+
+        If expr is given, returns an assignment under which the expression
+        and expr differ instead. Returns None if there is no such
+        assignment, in the form of {'variable_name': True/False}.
+
+        E.g. p -> q  gives  {'p': True, 'q': False}
+        """
+        if expr is None:
+            return Not(self).satisfy()
+        return Xor(self, parse(expr)).satisfy()
+
     def equivalent(self, expr):
         """Returns bool as to whether the expression is equivalent to expr
 
-        If the logical biconditional of self and expr
-        is a tautology, then they are equivalent
+        If there is no assignment under which self and expr differ,
+        then they are equivalent
 
         E.g. p ^ (p v q)  <->  p
         """
-        expr = parse(expr)
-        return Biconditional(self, expr).is_tautology()
+        return self.counterexample(expr) is None
 
     def evaluate(self, variables):
         """Evaluates the expression
 
         Note: variables is a dictonary in the
         form of {'variable_name': True/False}
+
+        Variables may be missing if those given decide the value, e.g.
+        p ^ q  is False given {'p': False}; otherwise raises KeyError.
         """
         raise NotImplementedError
 
+    def restrict(self, values):
+        """Returns the expression with variables fixed to values, simplified
+
+        values maps the names of the variables to fix to True/False.
+
+        E.g. (p ^ q) v r  given {'p': True}  gives  q v r
+        """
+        return rewrite(self, values)
+
     def identical(self, expr):
         """Returns bool as to whether the expression is identical to expr
 
-        Note: checks structure, may not be the same instance!
+        Note: checks structure, may not be the same instance! (unless
+        both are interned, see intern)
+        """
+        stack = [(self, parse(expr))]
+        while stack:
+            a, b = stack.pop()
+            if a is b:
+                continue
+            if a.interned and b.interned:
+                # interned expressions are identical only if the same
+                return False
+            if type(a) is not type(b) or a.label() != b.label():
+                return False
+            terms_a, terms_b = a.get_terms(), b.get_terms()
+            if len(terms_a) != len(terms_b):
+                return False
+            stack.extend(zip(terms_a, terms_b))
+        return True
+
+    def compile(self, names=None):
+        """Compiles the expression into a Python function
+
+        The function takes a tuple of values, one for each variable in
+        names (defaults to get_names()), and returns the value of the
+        expression. It evaluates far faster than evaluate, and evaluates
+        the expression once it is rewritten (see rewrite).
+
+        E.g. parse('p -> q').compile()((True, False))  ->  False
+        """
+        if names is None:
+            names = self.get_names()
+        return Compiler(names).compile(rewrite(self))
+
+    def compile_term(self, compiler, terms):
+        """Emits the code for the expression, returning its Python term,
+        given the Python terms of its terms in the order of get_terms()
+        """
+        raise NotImplementedError
+
+    def evaluate_bits(self, variables, mask):
+        """Evaluates the expression for many assignments at once
+
+        Each variable maps to an integer whose bits are its values in each
+        assignment, and mask has a bit set for every assignment. Returns
+        an integer of the expression's values in the same bits.
+
+        Note: NumPy boolean arrays work too, with a mask of numpy.True_
+        """
+        raise NotImplementedError
+
+    def combine(self, values, variables):
+        """Evaluates the expression given the values of its terms
+
+        values are in the order of get_terms(), so only variables and
+        constants look at variables.
         """
         raise NotImplementedError
 
+    def combine_bits(self, values, variables, mask):
+        """As combine, but for many assignments at once (see evaluate_bits)"""
+        raise NotImplementedError
+
+    def evaluate_batch(self, columns, names=None):
+        """Evaluates the expression for a batch of assignments with NumPy
+
+        columns is a dictionary in the form of {'variable_name': array},
+        or a 2D array with a column for each variable in names. Returns a
+        boolean array of the value of the expression for each row.
+        """
+        if numpy is None:
+            raise ImportError('evaluate_batch requires NumPy')
+
+        if names is None:
+            columns = dict((name, numpy.asarray(column, dtype=bool))
+                           for name, column in columns.items())
+            shape = next(iter(columns.values())).shape if columns else ()
+        else:
+            columns = numpy.asarray(columns, dtype=bool)
+            shape = columns.shape[:1]
+            columns = dict(zip(names, columns.T))
+
+        values = DAG(rewrite(self)).evaluate_bits(columns, numpy.True_)
+        return numpy.array(numpy.broadcast_to(values, shape))
+
+    def truth_bits(self, names=None):
+        """Returns (bits, mask) for the expression's entire truth table
+
+        Bit i of bits is the value of the expression in row i of the truth
+        table over names (defaults to get_names()), computed with a single
+        bitwise pass over the expression once it is rewritten, evaluating
+        each distinct term once (see DAG).
+        """
+        if names is None:
+            names = self.get_names()
+        masks, mask = bool_masks(len(names))
+        variables = dict(zip(names, masks))
+        return DAG(rewrite(self)).evaluate_bits(variables, mask), mask
+
+    def tseitin(self, cnf):
+        """Adds the clauses defining the expression to cnf
+
+        Returns the literal equivalent to the expression. Each distinct
+        term is encoded once, after its own terms (see tseitin_term).
+        """
+        lits = {} # id of each term -> its literal
+        for expr in postorder(self):
+            lits[id(expr)] = expr.tseitin_term(
+                cnf, [lits[id(t)] for t in expr.get_terms()])
+        return lits[id(self)]
+
+    def tseitin_term(self, cnf, lits):
+        """Adds the clauses defining the expression to cnf, returning its
+        literal, given the literals of its terms in the order of get_terms()
+        """
+        raise NotImplementedError
+
+    def satisfy(self):
+        """Returns an assignment under which the expression is true
+
+        The assignment is found by a SAT solver and is in the form of
+        {'variable_name': True/False}, or None if there is none. The
+        expression is interned first, so identical terms, e.g. those of
+        both sides of counterexample, are encoded once.
+        """
+        cnf = CNF()
+        cnf.add([intern(self).tseitin(cnf)])
+        return cnf.solve()
+
+    def iter_models(self, names=None):
+        """Yields each assignment under which the expression is true
+
+        Assignments are to names, which defaults to get_names(). Each is
+        found by a SAT solver, then blocked so the next solution differs,
+        so an assignment to fewer names than the expression has is
+        yielded once however many ways it extends to a model.
+        """
+        if names is None:
+            names = self.get_names()
+        cnf = CNF()
+        cnf.add([intern(self).tseitin(cnf)])
+        variables = [cnf.var(name) for name in names]
+
+        solver = sat.Solver(cnf.clauses, cnf.num_vars)
+        while solver.solve():
+            model = solver.model
+            yield dict((name, model[var]) for name, var in zip(names, variables))
+            solver.add_clause([-var if model[var] else var for var in variables])
+
     def is_contradiction(self):
-        return not any(TruthTable(self).values)
+        return self.satisfy() is None
 
     def is_tautology(self):
-        return all(TruthTable(self).values)
+        return self.counterexample() is None
 
 class Unconditional(Expression):
+    __slots__ = ('symbol', 'value')
+
     def __init__(self, symbol, value):
+        super(Unconditional, self).__init__()
         self.symbol = symbol
         self.value = value
 
@@ -191,20 +529,36 @@ class Unconditional(Expression):
     def get_names(self):
         return []
 
+    def label(self):
+        return self.value
+
     def evaluate(self, _=None):
         return self.value
 
-    def identical(self, expr):
-        expr = parse(expr)
-        if not isinstance(expr, Unconditional):
-            return False
-        return expr.value == self.value
+    def evaluate_bits(self, _, mask):
+        return mask if self.value else mask ^ mask
+
+    def combine(self, values, variables):
+        return self.value
+
+    def combine_bits(self, values, variables, mask):
+        return mask if self.value else mask ^ mask
+
+    def compile_term(self, compiler, terms):
+        return repr(self.value)
+
+    def tseitin_term(self, cnf, lits):
+        return cnf.true() if self.value else -cnf.true()
+
 
 T = Unconditional('T', True)
 F = Unconditional('F', False)
 
 class Var(Expression):
+    __slots__ = ('name',)
+
     def __init__(self, name):
+        super(Var, self).__init__()
         self.name = name
 
     def __len__(self):
@@ -216,14 +570,27 @@ class Var(Expression):
     def get_names(self):
         return [self.name]
 
+    def label(self):
+        return self.name
+
     def evaluate(self, variables):
         return variables[self.name]
 
-    def identical(self, expr):
-        expr = parse(expr)
-        if not isinstance(expr, Var):
-            return False
-        return self.name == expr.name
+    def evaluate_bits(self, variables, _):
+        return variables[self.name]
+
+    def combine(self, values, variables):
+        return variables[self.name]
+
+    def combine_bits(self, values, variables, mask):
+        return variables[self.name]
+
+    def compile_term(self, compiler, terms):
+        return compiler.args[self.name]
+
+    def tseitin_term(self, cnf, lits):
+        return cnf.var(self.name)
+
 
 def wrap(term, op):
     if (# never put brackets around T/F or p
@@ -239,10 +606,28 @@ def wrap(term, op):
     return '(%s)' % term
 
 class Operation(Expression):
-    pass
+    __slots__ = ()
+
+    def get_names(self):
+        # walk with a stack rather than recursing, visiting shared terms once
+        names = set()
+        seen = set()
+        stack = [self]
+        while stack:
+            expr = stack.pop()
+            if id(expr) in seen:
+                continue
+            seen.add(id(expr))
+            if isinstance(expr, Var):
+                names.add(expr.name)
+            stack.extend(expr.get_terms())
+        return sorted(names)
 
 class Not(Operation):
+    __slots__ = ('term',)
+
     def __init__(self, term):
+        super(Not, self).__init__()
         term = parse(term)
         self.term = term
 
@@ -252,20 +637,35 @@ class Not(Operation):
     def __str__(self):
         return str(b'\xc2\xac', 'utf-8') + wrap(self.term, Not)
 
-    def get_names(self):
-        return self.term.get_names()
+    def get_terms(self):
+        return [self.term]
+
+    def with_terms(self, terms):
+        return Not(*terms)
 
     def evaluate(self, variables):
         term = self.term.evaluate(variables)
         return not term
 
-    def identical(self, expr):
-        expr = parse(expr)
-        if not isinstance(expr, Not):
-            return False
-        return self.term.identical(expr.term)
+    def evaluate_bits(self, variables, mask):
+        return mask ^ self.term.evaluate_bits(variables, mask)
+
+    def combine(self, values, variables):
+        return not values[0]
+
+    def combine_bits(self, values, variables, mask):
+        return mask ^ values[0]
+
+    def compile_term(self, compiler, terms):
+        return compiler.emit('not ' + terms[0])
+
+    def tseitin_term(self, cnf, lits):
+        return -lits[0]
+
 
 class BinaryOperation(Operation):
+    __slots__ = ('terms',)
+
     def __getitem__(self, index):
         return self.terms[index]
 
@@ -277,15 +677,12 @@ class BinaryOperation(Operation):
         return len(self.terms)
 
     def append(self, term):
+        if self.frozen:
+            raise TypeError('cannot append to a frozen expression')
         self.terms.append(term)
 
-    def get_names(self):
-        names = []
-        for term in self:
-            for name in term.get_names():
-                if name not in names:
-                    names.append(name)
-        return sorted(names)
+    def get_terms(self):
+        return list(self.terms)
 
 operations = {}
 
@@ -302,9 +699,16 @@ def set_operation(symbol, operation):
 def operation(name, rule, unicode_symbol, *symbols, **kwargs):
     two_args = kwargs.get('two_args', False)
     precedence = kwargs.get('precedence', 1)
+    inline = kwargs.get('inline', None)
+    bitwise = kwargs.get('bitwise', None)
+    clauses = kwargs.get('tseitin', None)
+    partial = kwargs.get('partial', None)
 
     class BinaryOp(BinaryOperation):
+        __slots__ = ()
+
         def __init__(self, *terms):
+            super(BinaryOp, self).__init__()
             self.terms = list(terms)
             if len(terms) < 2:
                 raise TypeError(('binary operators take at least 2 ' +
@@ -319,26 +723,92 @@ def operation(name, rule, unicode_symbol, *symbols, **kwargs):
             separator = ' %s ' % unicode_symbol
             return separator.join(terms)
 
+        def with_terms(self, terms):
+            return BinaryOp(*terms)
+
         def evaluate(self, variables):
-            # evaluate all terms
-            values = map(lambda t: t.evaluate(variables), self.terms)
+            # evaluate all terms, noting those missing variables
+            values, missing = [], None
+            for term in self.terms:
+                try:
+                    values.append(term.evaluate(variables))
+                except KeyError as e:
+                    values.append(None)
+                    if missing is None:
+                        missing = e
 
             # apply rule to evaluated terms
+            if missing is None:
+                return rule(*values)
+
+            # unless the known terms decide the value, it is unknown too
+            value = evaluate_partial(values)
+            if value is None:
+                raise missing
+            return value
+
+        def evaluate_bits(self, variables, mask):
+            values = [t.evaluate_bits(variables, mask) for t in self.terms]
+            return self.combine_bits(values, variables, mask)
+
+        def combine(self, values, variables):
             return rule(*values)
 
-        def identical(self, expr):
-            expr = parse(expr)
-            if not isinstance(expr, BinaryOp) or \
-               len(self) != len(expr):
-                return False
-            for i, term in enumerate(self):
-                if not term.identical(expr[i]):
-                    return False
-            return True
+        def combine_bits(self, values, variables, mask):
+            if bitwise is not None:
+                return bitwise(mask, *values)
+
+            # no bitwise rule, so apply the rule to each bit (or element)
+            if not isinstance(mask, int):
+                return numpy.vectorize(rule, otypes=[bool])(*values)
+            bits = 0
+            for i in range(mask.bit_length()):
+                if rule(*[bool(value >> i & 1) for value in values]):
+                    bits |= 1 << i
+            return bits
+
+        def compile_term(self, compiler, terms):
+            if inline is None:
+                # no inline code for the rule, so call it instead
+                return compiler.emit('%s(%s)' % (compiler.function(rule),
+                                                 ', '.join(terms)))
+            return compiler.emit(inline(*terms))
+
+        def tseitin_term(self, cnf, lits):
+            if clauses is not None:
+                return clauses(cnf, *lits)
+
+            # no clauses for the rule, so use a clause for each assignment
+            out = cnf.new_var()
+            for perm in bool_permutations(len(lits)):
+                clause = [-l if v else l for l, v in zip(lits, perm)]
+                cnf.add(clause + [out if rule(*perm) else -out])
+            return out
+
+    def evaluate_partial(values):
+        # the value of the operation given values, None for those unknown,
+        # or None if the values known do not decide it
+        if partial is not None:
+            return partial(*values)
+
+        # no partial rule, so try each value of the unknown terms
+        unknown = [i for i, value in enumerate(values) if value is None]
+        result = None
+        for perm in itertools.product((True, False), repeat=len(unknown)):
+            for i, value in zip(unknown, perm):
+                values[i] = value
+            value = bool(rule(*values))
+            if result is None:
+                result = value
+            elif value != result:
+                return None
+        return result
 
     BinaryOp.__name__ = name
     BinaryOp.two_args = two_args
     BinaryOp.precedence = precedence
+    BinaryOp.rule = staticmethod(rule)
+    BinaryOp.bitwise = staticmethod(bitwise)
 
     set_operation(unicode_symbol, BinaryOp)
     for symbol in symbols:
@@ -367,23 +837,892 @@ def conditional(p, q):
 def biconditional(*values):
     return reduce(lambda p, q: p == q, values)
 
-And = operation('And', and_, u'\u2227', 'AND', '^', '&', '&&',)
+# partial rules, for values that may be None if unknown
 
-Or = operation('Or', or_, u'\u2228', 'OR', 'v', '|', '||')
+def negate(value):
+    return None if value is None else not value
 
-Xor = operation('Xor', xor, u'\u2295', 'XOR', two_args=True)
-
-Nand = operation('Nand', nand, u'\u2191', 'NAND')
+def and_partial(*values):
+    if any(value is not None and not value for value in values):
+        return False
+    return None if None in values else True
 
-Nor = operation('Nor', nor, u'\u2193', 'NOR')
+def or_partial(*values):
+    if any(value is not None and value for value in values):
+        return True
+    return None if None in values else False
+
+And = operation('And', and_, u'\u2227', 'AND', '^', '&', '&&',
+               inline=lambda *t: ' and '.join(t),
+               bitwise=lambda _, *v: reduce(lambda p, q: p & q, v),
+               tseitin=lambda cnf, *l: cnf.and_(l),
+               partial=and_partial)
+
+Or = operation('Or', or_, u'\u2228', 'OR', 'v', '|', '||',
+               inline=lambda *t: ' or '.join(t),
+               bitwise=lambda _, *v: reduce(lambda p, q: p | q, v),
+               tseitin=lambda cnf, *l: cnf.or_(l),
+               partial=or_partial)
+
+Xor = operation('Xor', xor, u'\u2295', 'XOR', two_args=True,
+                inline=lambda p, q: '%s != %s' % (p, q),
+                bitwise=lambda _, p, q: p ^ q,
+                tseitin=lambda cnf, p, q: cnf.xor(p, q))
+
+Nand = operation('Nand', nand, u'\u2191', 'NAND',
+                 inline=lambda *t: 'not (%s)' % ' and '.join(t),
+                 bitwise=lambda m, *v: m ^ reduce(lambda p, q: p & q, v),
+                 tseitin=lambda cnf, *l: -cnf.and_(l),
+                 partial=lambda *v: negate(and_partial(*v)))
+
+Nor = operation('Nor', nor, u'\u2193', 'NOR',
+                inline=lambda *t: 'not (%s)' % ' or '.join(t),
+                bitwise=lambda m, *v: m ^ reduce(lambda p, q: p | q, v),
+                tseitin=lambda cnf, *l: -cnf.or_(l),
+                partial=lambda *v: negate(or_partial(*v)))
 
 Conditional = operation('Conditional', conditional, u'\u2192',
                         '->', '-->', '=>', '==>', precedence=2,
-                        two_args=True)
+                        two_args=True,
+                        inline=lambda p, q: 'not %s or %s' % (p, q),
+                        bitwise=lambda m, p, q: (m ^ p) | q,
+                        tseitin=lambda cnf, p, q: cnf.or_([-p, q]),
+                        partial=lambda p, q: or_partial(negate(p), q))
 
 Biconditional = operation('Biconditional', biconditional, u'\u2194',
                           '<->', '<-->', '<=>', '<==>', '=', 'eq', 'XNOR',
-                          precedence=3)
+                          precedence=3,
+                          inline=lambda *t: reduce(
+                              lambda p, q: '(%s) == %s' % (p, q), t),
+                          bitwise=lambda m, *v: reduce(
+                              lambda p, q: m ^ p ^ q, v),
+                          tseitin=lambda cnf, *l: reduce(
+                              lambda p, q: -cnf.xor(p, q), l))
+
+# =============================================================================
+# Traversal
+# =============================================================================
+
+def postorder(expr, skip=None):
+    """Generates each distinct term of expr, by identity, after its terms
+
+    Terms are taken first to last. Those for which skip(term) is true,
+    e.g. terms already dealt with, are neither generated nor walked into.
+    The walk uses a stack rather than recursion, so expressions of any
+    depth can be walked; callers keep their results keyed by id(term).
+    """
+    done = set() # ids of the terms generated or skipped
+    stack = [expr]
+    while stack:
+        term = stack[-1]
+        if id(term) in done:
+            stack.pop()
+            continue
+        if skip is not None and skip(term):
+            done.add(id(term))
+            stack.pop()
+            continue
+        pending = [t for t in term.get_terms() if id(t) not in done]
+        if pending:
+            stack.extend(reversed(pending))
+            continue
+        stack.pop()
+        done.add(id(term))
+        yield term
+
+# =============================================================================
+# Interning
+# =============================================================================
+
+interned = weakref.WeakValueDictionary()
+
+def intern(expr):
+    """Returns the shared, frozen expression identical to expr
+
+    Identical terms of interned expressions are the same object, so that
+    identical() is an identity check and a set of interned expressions
+    holds one expression of each structure.
+    """
+    expr = parse(expr)
+    shared = {} # id of each term of expr -> its interned expression
+    for term in postorder(expr, lambda t: t.interned):
+        terms = [t if t.interned else shared[id(t)] for t in term.get_terms()]
+        key = (type(term), term.label()) + tuple(map(id, terms))
+        new = interned.get(key)
+        if new is None:
+            new = term.with_terms(terms)
+            new.frozen = new.interned = True
+            new.hash_value = hash((type(term), term.label()) +
+                                  tuple(t.hash_value for t in terms))
+            interned[key] = new
+        shared[id(term)] = new
+
+    return expr if expr.interned else shared[id(expr)]
+
+# =============================================================================
+# Rewriting
+# =============================================================================
+
+rewrite_rules = {} # expression class -> the rules for its expressions
+
+def rewrite_rule(*classes):
+    """Registers the decorated function as a rule for expressions of classes
+
+    A rule takes an interned expression whose terms have been rewritten, and
+    returns an equivalent but smaller expression, or None if it does not
+    apply. Rules for a class apply to its subclasses too.
+    """
+    def register(rule):
+        for cls in classes:
+            rewrite_rules.setdefault(cls, []).append(rule)
+        return rule
+    return register
+
+def rewrite(expr, values=None):
+    """Returns expr reduced by the rewrite rules, interned
+
+    The rules fold constants, flatten nested operations, and remove double
+    negations and duplicate or absorbed terms. Each distinct term of expr
+    is rewritten once, after its own terms, by applying the rules to it
+    until none applies. Variables named in values are first replaced by
+    their constants.
+    """
+    expr = intern(expr)
+    rewritten = {} # id of each term of expr -> its rewritten expression
+    for term in postorder(expr):
+        if values and isinstance(term, Var) and term.name in values:
+            rewritten[id(term)] = constant(values[term.name])
+            continue
+
+        terms = term.get_terms()
+        new_terms = [rewritten[id(t)] for t in terms]
+        new = term
+        if any(n is not t for n, t in zip(new_terms, terms)):
+            new = intern(term.with_terms(new_terms))
+        rewritten[id(term)] = apply_rules(new)
+    return rewritten[id(expr)]
+
+def apply_rules(expr):
+    # apply the rules to expr, whose terms are rewritten, until none applies
+    while True:
+        for cls in type(expr).__mro__:
+            for rule in rewrite_rules.get(cls, ()):
+                result = rule(expr)
+                if result is not None:
+                    break
+            else:
+                continue
+            break
+        else:
+            return expr
+        expr = intern(result)
+
+def constant(value):
+    return T if value else F
+
+@rewrite_rule(BinaryOperation)
+def fold_constants(expr):
+    # any operation of constants is a constant
+    if all(isinstance(t, Unconditional) for t in expr):
+        return constant(expr.rule(*[t.value for t in expr]))
+
+@rewrite_rule(Not)
+def rewrite_not(expr):
+    term = expr.term
+    if isinstance(term, Unconditional):
+        return constant(not term.value)
+    if isinstance(term, Not):
+        return term.term
+
+@rewrite_rule(And, Or, Biconditional)
+def flatten(expr):
+    # e.g. p ^ (q ^ r)  ->  p ^ q ^ r
+    op = type(expr)
+    if any(type(t) is op for t in expr):
+        terms = []
+        for t in expr:
+            terms.extend(t.terms if type(t) is op else [t])
+        return op(*terms)
+
+@rewrite_rule(And, Or, Nand, Nor)
+def rewrite_and_or(expr):
+    # dominant is the value of any term that decides the operation
+    op = type(expr)
+    dominant = op in (Or, Nor)
+    negated = op in (Nand, Nor)
+
+    terms, ids = [], set()
+    for t in expr:
+        if isinstance(t, Unconditional):
+            if t.value == dominant:
+                return constant(dominant != negated)
+        elif id(t) not in ids:
+            terms.append(t)
+            ids.add(id(t))
+    # e.g. p ^ ~p  ->  F
+    for t in terms:
+        if isinstance(t, Not) and id(t.term) in ids:
+            return constant(dominant != negated)
+
+    if len(terms) == len(expr):
+        return None
+    if not terms:
+        return constant(dominant == negated)
+    if len(terms) == 1:
+        return Not(terms[0]) if negated else terms[0]
+    return op(*terms)
+
+@rewrite_rule(And, Or)
+def absorb(expr):
+    # e.g. p ^ (p v q)  ->  p, and (p v q) ^ (p v q v r)  ->  p v q
+    dual = Or if type(expr) is And else And
+
+    terms = expr.terms
+    parts = [set(map(id, t.terms)) if type(t) is dual else {id(t)}
+             for t in terms]
+
+    # index each term by its rarest part: a term can only absorb those
+    # containing that part, so each is tested against few others
+    counts = Counter(part for ps in parts for part in ps)
+    absorbers = defaultdict(list) # part -> the terms indexed by it
+    for i, ps in enumerate(parts):
+        absorbers[min(ps, key=counts.__getitem__)].append(i)
+
+    removed = set()
+    for i in reversed(range(len(terms))):
+        if type(terms[i]) is not dual:
+            continue
+        for part in parts[i]:
+            if any(j != i and j not in removed and parts[j] <= parts[i]
+                   for j in absorbers.get(part, ())):
+                removed.add(i)
+                break
+    if removed:
+        terms = [t for i, t in enumerate(terms) if i not in removed]
+        return terms[0] if len(terms) == 1 else type(expr)(*terms)
+
+@rewrite_rule(Biconditional)
+def rewrite_biconditional(expr):
+    # T terms can go, each F term negates the rest, and pairs of identical
+    # terms cancel out, e.g. p <-> q <-> p <-> F  ->  ~q
+    negated = False
+    counts = OrderedDict() # id of each other term -> (term, its count)
+    for t in expr:
+        if isinstance(t, Unconditional):
+            negated ^= not t.value
+        else:
+            count = counts.get(id(t), (t, 0))[1]
+            counts[id(t)] = (t, count + 1)
+    terms = [t for t, count in counts.values() if count % 2]
+
+    if len(terms) == len(expr):
+        return None
+    if not terms:
+        return constant(not negated)
+    result = terms[0] if len(terms) == 1 else Biconditional(*terms)
+    return Not(result) if negated else result
+
+@rewrite_rule(Xor)
+def rewrite_xor(expr):
+    p, q = expr.terms
+    if p is q:
+        return F
+    if isinstance(q, Unconditional):
+        p, q = q, p
+    if isinstance(p, Unconditional):
+        return Not(q) if p.value else q
+
+@rewrite_rule(Conditional)
+def rewrite_conditional(expr):
+    p, q = expr.terms
+    if p is q or isinstance(p, Unconditional) and not p.value:
+        return T
+    if isinstance(q, Unconditional):
+        return T if q.value else Not(p)
+    if isinstance(p, Unconditional):
+        return q
+
+# =============================================================================
+# Shared Subexpressions
+# =============================================================================
+
+class DAG(object):
+    """An expression as a graph of its distinct terms
+
+    Identical terms are a single node, so each is evaluated once however
+    many times it occurs. nodes lists the distinct terms of the interned
+    expression, each after its own terms, and terms lists the indices in
+    nodes of the terms of each node.
+    """
+
+    def __init__(self, expr):
+        self.expression = intern(expr)
+        self.nodes = []
+        self.terms = []
+        index = {} # id of each node -> its index in nodes
+        for node in postorder(self.expression):
+            index[id(node)] = len(self.nodes)
+            self.nodes.append(node)
+            self.terms.append([index[id(t)] for t in node.get_terms()])
+
+        # the number of nodes below each node, were the terms not shared
+        sizes = []
+        for terms in self.terms:
+            sizes.append(1 + sum(sizes[i] for i in terms))
+        self.tree_size = sizes[-1]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def evaluate(self, variables):
+        """Evaluates the expression, evaluating each node once
+
+        As Expression.evaluate, variables maps names to True/False.
+        """
+        values = []
+        for node, terms in zip(self.nodes, self.terms):
+            values.append(node.combine([values[i] for i in terms], variables))
+        return values[-1]
+
+    def evaluate_bits(self, variables, mask):
+        """As Expression.evaluate_bits, evaluating each node once"""
+        values = []
+        for node, terms in zip(self.nodes, self.terms):
+            values.append(node.combine_bits([values[i] for i in terms],
+                                            variables, mask))
+        return values[-1]
+
+    def report(self):
+        """Returns a line comparing the number of nodes and distinct nodes
+
+        E.g. 'Nodes: 9 (6 distinct)'
+        """
+        return 'Nodes: %d (%d distinct)' % (self.tree_size, len(self))
+
+# =============================================================================
+# Compiler
+# =============================================================================
+
+class Compiler(object):
+    """Compiles an expression into a flat Python function
+
+    Each operation becomes a single assignment to a temporary, so the
+    generated code has no nesting however deep the expression is. Terms
+    of interned expressions that are the same object are computed once.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.args = dict((name, 'v%d' % i) for i, name in enumerate(names))
+        self.lines = []
+        self.env = {}
+        self.terms = {} # id of each term compiled -> its Python term
+
+    def emit(self, code):
+        # assign code to a new temporary, returning the temporary's name
+        temp = 't%d' % len(self.lines)
+        self.lines.append('%s = %s' % (temp, code))
+        return temp
+
+    def term(self, expr):
+        # compile expr unless it already has been, returning its Python term
+        for term in postorder(expr, lambda t: id(t) in self.terms):
+            self.terms[id(term)] = term.compile_term(
+                self, [self.terms[id(t)] for t in term.get_terms()])
+        return self.terms[id(expr)]
+
+    def function(self, func):
+        # make func available to the generated code, returning its name
+        name = '_f%d' % len(self.env)
+        self.env[name] = func
+        return name
+
+    def compile(self, expr):
+        result = self.term(expr)
+        lines = ['def evaluate(v):']
+        if self.names:
+            lines.append('%s, = v' % ', '.join(
+                self.args[name] for name in self.names))
+        lines.extend(self.lines)
+        lines.append('return ' + result)
+        source = '\n    '.join(lines) + '\n'
+
+        exec(compile(source, '<expression>', 'exec'), self.env)
+        evaluate = self.env['evaluate']
+        evaluate.names = self.names
+        evaluate.source = source
+        return evaluate
+
+# =============================================================================
+# Satisfiability
+# =============================================================================
+
+class Clauses(object):
+    """A list of clauses of literals over numbered variables
+
+    A literal is a nonzero int: k stands for the kth variable and -k for
+    its negation. names maps each variable name onto its number; other
+    variables, e.g. those introduced by the Tseitin encoding, are unnamed.
+    """
+
+    # the operations joining literals into clauses, and clauses together
+    clause_op = None
+    formula_op = None
+
+    def __init__(self):
+        self.clauses = []
+        self.names = {}
+        self.num_vars = 0
+
+    def __len__(self):
+        return len(self.clauses)
+
+    def add(self, clause):
+        self.clauses.append(list(clause))
+
+    def new_var(self):
+        self.num_vars += 1
+        return self.num_vars
+
+    def var(self, name):
+        if name not in self.names:
+            self.names[name] = self.new_var()
+        return self.names[name]
+
+    def literal(self, lit, var_names=None):
+        # the expression of lit, naming unnamed variables _1, _2, etc.
+        if var_names is None:
+            var_names = dict((v, name) for name, v in self.names.items())
+        var = Var(var_names.get(abs(lit), '_%d' % abs(lit)))
+        return var if lit > 0 else Not(var)
+
+    def to_expression(self):
+        """Returns the clauses as an expression, e.g. (p v ~q) ^ r"""
+        var_names = dict((v, name) for name, v in self.names.items())
+        clauses = []
+        for clause in self.clauses:
+            lits = [self.literal(lit, var_names) for lit in clause]
+            clauses.append(join(self.clause_op, lits))
+        return join(self.formula_op, clauses)
+
+class CNF(Clauses):
+    """A formula in conjunctive normal form
+
+    Each clause is true when any of its literals is, and the formula when
+    every clause is.
+    """
+
+    clause_op = Or
+    formula_op = And
+
+    def __init__(self):
+        super(CNF, self).__init__()
+        self.true_var = None
+
+    def true(self):
+        # a literal that is always true
+        if self.true_var is None:
+            self.true_var = self.new_var()
+            self.add([self.true_var])
+        return self.true_var
+
+    def and_(self, lits):
+        out = self.new_var()
+        for lit in lits:
+            self.add([-out, lit])
+        self.add([out] + [-lit for lit in lits])
+        return out
+
+    def or_(self, lits):
+        out = self.new_var()
+        for lit in lits:
+            self.add([out, -lit])
+        self.add([-out] + list(lits))
+        return out
+
+    def xor(self, p, q):
+        out = self.new_var()
+        self.add([-out, p, q])
+        self.add([-out, -p, -q])
+        self.add([out, -p, q])
+        self.add([out, p, -q])
+        return out
+
+    def solve(self):
+        """Returns an assignment satisfying the clauses, or None
+
+        The assignment is in the form of {'variable_name': True/False}
+        """
+        solver = sat.Solver(self.clauses, self.num_vars)
+        if not solver.solve():
+            return None
+        return dict((name, solver.model[var])
+                    for name, var in self.names.items())
+
+class DNF(Clauses):
+    """A formula in disjunctive normal form
+
+    Each clause is true when every one of its literals is, and the formula
+    when any clause is.
+    """
+
+    clause_op = And
+    formula_op = Or
+
+# =============================================================================
+# Normal Forms
+# =============================================================================
+
+class TooManyClausesError(Exception):
+    pass
+
+# the most clauses to_cnf and to_dnf will build, and the most pairs of
+# clauses they distribute at once, per clause allowed
+MAX_CLAUSES = 2 ** 12
+DISTRIBUTE_PAIRS = 64
+
+def join(op, terms):
+    """Returns op of terms, allowing fewer than 2 terms
+
+    E.g. join(And, [])  ->  T,  join(Or, [p])  ->  p
+    """
+    if not terms:
+        return T if op is And else F
+    return terms[0] if len(terms) == 1 else op(*terms)
+
+def nnf_template(expr, positive):
+    # expr, or its negation if not positive, as a tree of And and Or over
+    # (term, positive) pairs, in the form of (op, [items]) or a pair
+    op = type(expr)
+    if op is Not:
+        return (expr.term, not positive)
+    terms = expr.terms
+    if op in (And, Or, Nand, Nor):
+        negated = op in (Nand, Nor)
+        conjunction = (op in (And, Nor)) == positive
+        return (And if conjunction else Or,
+                [(t, positive != negated) for t in terms])
+    if op is Conditional:
+        p, q = terms
+        if positive:
+            return (Or, [(p, False), (q, True)])
+        return (And, [(p, True), (q, False)])
+    if op in (Xor, Biconditional):
+        # reduce an n-ary Biconditional to a binary one, interning the rest
+        # so nnf meets it again as the same term
+        p = terms[0] if len(terms) == 2 else intern(Biconditional(*terms[:-1]))
+        q = terms[-1]
+        differ = (op is Xor) == positive
+        return (Or, [(And, [(p, True), (q, not differ)]),
+                     (And, [(p, False), (q, differ)])])
+
+    # any other operation, by the rows of its truth table
+    rows = [perm for perm in bool_permutations(len(terms))
+            if bool(expr.rule(*perm)) == positive]
+    return (Or, [(And, list(zip(terms, perm))) for perm in rows])
+
+def nnf(expr):
+    """Returns expr in negation normal form
+
+    The result is made of And, Or, T, F and variables, negated or not.
+    Its terms are shared, so although an expression such as a chain of
+    Xor written out in full grows exponentially, the result has a node
+    for each term of expr at most twice over.
+    """
+    expr = intern(expr)
+    results = {} # (id of term, positive) -> its expression in NNF
+    templates = {}
+
+    def pairs(template):
+        # the (term, positive) pairs in template
+        if isinstance(template[0], Expression):
+            return [template]
+        return [pair for item in template[1] for pair in pairs(item)]
+
+    def build(template):
+        if isinstance(template[0], Expression):
+            return results[(id(template[0]), template[1])]
+        op, items = template
+        return join(op, [build(item) for item in items])
+
+    stack = [(expr, True)]
+    while stack:
+        term, positive = stack[-1]
+        key = (id(term), positive)
+        if key in results:
+            stack.pop()
+            continue
+        if isinstance(term, Var):
+            results[key] = term if positive else Not(term)
+            stack.pop()
+            continue
+        if isinstance(term, Unconditional):
+            results[key] = T if term.value == positive else F
+            stack.pop()
+            continue
+
+        if key not in templates:
+            templates[key] = nnf_template(term, positive)
+        template = templates[key]
+        pending = [pair for pair in pairs(template)
+                   if (id(pair[0]), pair[1]) not in results]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        results[key] = build(template)
+
+    return rewrite(results[(id(expr), True)])
+
+def tseitin_cnf(expr):
+    """Returns the CNF of the Tseitin encoding of expr
+
+    The CNF is satisfiable exactly when expr is, and grows linearly with
+    expr, having a variable for each term. The variables of expr come
+    first, numbered in the order of get_names().
+    """
+    expr = intern(expr)
+    cnf = CNF()
+    for name in expr.get_names():
+        cnf.var(name)
+    cnf.add([expr.tseitin(cnf)])
+    return cnf
+
+def clause_product(clause_sets, max_clauses):
+    # the clauses of the disjunction of clause_sets, one literal from each
+    product = {frozenset()}
+    for clauses in clause_sets:
+        if len(product) * len(clauses) > max_clauses * DISTRIBUTE_PAIRS:
+            raise TooManyClausesError(
+                'the normal form needs more than %d pairs of clauses '
+                'distributed at once' % (max_clauses * DISTRIBUTE_PAIRS))
+        multiplied = set()
+        for clause in product:
+            for other in clauses:
+                if not any(-lit in clause for lit in other):
+                    multiplied.add(clause | other)
+            if len(multiplied) > max_clauses:
+                raise TooManyClausesError(
+                    'the normal form has more than %d clauses' % max_clauses)
+        product = multiplied
+    return product
+
+def distribute(expr, cnf, max_clauses):
+    # the clauses of expr in NNF, as sets of literals, by distributing Or
+    # over And. Clauses with complementary literals are dropped.
+    results = {} # id of each term -> its set of clauses
+    for term in postorder(expr):
+        if isinstance(term, Unconditional):
+            results[id(term)] = set() if term.value else {frozenset()}
+        elif isinstance(term, Var):
+            results[id(term)] = {frozenset([cnf.var(term.name)])}
+        elif isinstance(term, Not):
+            results[id(term)] = {frozenset([-cnf.var(term.term.name)])}
+        else:
+            clause_sets = [results[id(t)] for t in term]
+            if isinstance(term, And):
+                clauses = set().union(*clause_sets)
+                if len(clauses) > max_clauses:
+                    raise TooManyClausesError(
+                        'the normal form has more than %d clauses'
+                        % max_clauses)
+            else:
+                clauses = clause_product(clause_sets, max_clauses)
+            results[id(term)] = clauses
+    return results[id(expr)]
+
+def to_normal_form(form, expr, max_clauses):
+    expr = parse(expr)
+    if max_clauses is None:
+        max_clauses = MAX_CLAUSES
+    for name in expr.get_names():
+        form.var(name)
+
+    # a DNF is the negation of the CNF of the negation
+    negated = isinstance(form, DNF)
+    clauses = distribute(nnf(Not(expr) if negated else expr), form,
+                         max_clauses)
+    if negated:
+        clauses = [[-lit for lit in clause] for clause in clauses]
+
+    def order(lits):
+        return [(abs(lit), lit < 0) for lit in lits]
+    for clause in sorted((sorted(c, key=abs) for c in clauses), key=order):
+        form.add(clause)
+    return form
+
+def to_cnf(expr, max_clauses=None):
+    """Returns expr in conjunctive normal form, as a CNF
+
+    The clauses are found by distributing Or over And, which can give
+    exponentially many, so TooManyClausesError is raised beyond
+    max_clauses, which defaults to MAX_CLAUSES, or if more than
+    max_clauses * DISTRIBUTE_PAIRS pairs of clauses would be distributed
+    at once. See tseitin_cnf for an equisatisfiable CNF that grows
+    linearly.
+    """
+    return to_normal_form(CNF(), expr, max_clauses)
+
+def to_dnf(expr, max_clauses=None):
+    """Returns expr in disjunctive normal form, as a DNF
+
+    As with to_cnf, TooManyClausesError is raised beyond max_clauses.
+    """
+    return to_normal_form(DNF(), expr, max_clauses)
+
+# =============================================================================
+# DIMACS
+# =============================================================================
+
+# the number of bytes iter_dimacs reads at a time
+DIMACS_CHUNK = 2 ** 16
+
+# the number of clauses write_dimacs writes at a time
+DIMACS_LINES = 2 ** 10
+
+# a comment, problem or end line, which the numbers must be taken out of
+dimacs_line_re = re.compile(br'(?:^|\n)[ \t]*[cp%]')
+
+def parse_ints(data):
+    # the whitespace separated ints in data, parsed by NumPy in one go if
+    # it is installed, rather than token by token
+    try:
+        if numpy is None:
+            return [int(token) for token in data.split()]
+        with warnings.catch_warnings():
+            # older versions of NumPy only warn about invalid data
+            warnings.simplefilter('error', DeprecationWarning)
+            return numpy.fromstring(data, dtype=numpy.int64, sep=' ')
+    except (ValueError, DeprecationWarning):
+        raise SyntaxError('expected literals, saw `%s`'
+                          % data.strip()[:40].decode('ascii', 'replace'))
+
+def read_dimacs_lines(data, cnf):
+    """Returns (data, ended) for data with its non-clause lines removed
+
+    Problem lines and name comments are read into cnf, if it is not None,
+    and ended is whether data has the % line that ends some files.
+    """
+    lines = []
+    for line in data.split(b'\n'):
+        words = line.split()
+        if not words or words[0][:1] not in (b'c', b'p', b'%'):
+            lines.append(line)
+        elif words[0] == b'%':
+            return b'\n'.join(lines), True
+        elif words[0] == b'p':
+            if len(words) != 4 or words[1] != b'cnf':
+                raise SyntaxError('expected p cnf <variables> <clauses>, '
+                                  'saw `%s`' % line.decode('ascii', 'replace'))
+            if cnf is not None:
+                cnf.num_vars = max(cnf.num_vars, int(words[2]))
+        elif words[0] == b'c' and len(words) == 4 and words[1] == b'var':
+            if cnf is not None:
+                name = words[3].decode('utf-8')
+                cnf.names[name] = int(words[2])
+    return b'\n'.join(lines), False
+
+def iter_dimacs(stream, cnf=None, chunk_size=DIMACS_CHUNK):
+    """Yields each clause of the DIMACS CNF read from stream
+
+    Clauses are lists of ints, as in CNF. The stream is read chunk_size
+    bytes at a time, and the numbers in each chunk are parsed all at once.
+    If cnf is given, the number of variables in the problem line is added
+    to it, as are the names in comments in the form "c var 1 p", written
+    by write_dimacs.
+    """
+    clause = []
+    rest = b''
+    ended = False
+    while not ended:
+        chunk = stream.read(chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            # keep any partial line for the next chunk
+            data = rest + chunk
+            end = data.rfind(b'\n') + 1
+            data, rest = data[:end], data[end:]
+        else:
+            data, rest, ended = rest, b'', True
+        if dimacs_line_re.search(data):
+            data, end = read_dimacs_lines(data, cnf)
+            ended = ended or end
+
+        # split the literals into clauses at each 0
+        values = parse_ints(data)
+        if numpy is not None:
+            zeros = numpy.flatnonzero(values == 0).tolist()
+            values = values.tolist()
+        else:
+            zeros = [i for i, value in enumerate(values) if value == 0]
+        start = 0
+        for zero in zeros:
+            clause.extend(values[start:zero])
+            yield clause
+            clause = []
+            start = zero + 1
+        clause.extend(values[start:])
+
+    if clause:
+        raise SyntaxError('expected 0, saw EOF')
+
+def read_dimacs(stream, chunk_size=DIMACS_CHUNK):
+    """Returns the CNF of the DIMACS CNF read from stream
+
+    Variables not named in comments are named x1, x2, etc. by number,
+    unless the name is taken. See iter_dimacs.
+    """
+    cnf = CNF()
+    for clause in iter_dimacs(stream, cnf, chunk_size):
+        cnf.clauses.append(clause)
+        if clause:
+            cnf.num_vars = max(cnf.num_vars, max(map(abs, clause)))
+
+    named = set(cnf.names.values())
+    for var in range(1, cnf.num_vars + 1):
+        name = 'x%d' % var
+        if var not in named and name not in cnf.names:
+            cnf.names[name] = var
+    return cnf
+
+def write_dimacs(cnf, stream):
+    """Writes cnf to stream in DIMACS CNF format, a few clauses at a time
+
+    cnf is a CNF, or an expression to write the tseitin_cnf of. Variable
+    names are written in comments, see iter_dimacs. Binary streams are
+    written bytes, other streams strings.
+    """
+    if not isinstance(cnf, CNF):
+        cnf = tseitin_cnf(cnf)
+    binary = isinstance(stream, (io.RawIOBase, io.BufferedIOBase))
+
+    def write(lines):
+        text = ''.join(lines)
+        stream.write(text.encode('utf-8') if binary else text)
+
+    lines = ['c var %d %s\n' % (var, name) for name, var
+             in sorted(cnf.names.items(), key=lambda item: item[1])]
+    lines.append('p cnf %d %d\n' % (cnf.num_vars, len(cnf.clauses)))
+    for clause in cnf.clauses:
+        lines.append(' '.join(map(str, clause + [0])) + '\n')
+        if len(lines) >= DIMACS_LINES:
+            write(lines)
+            lines = []
+    write(lines)
+
+# =============================================================================
+# Simplification
+# =============================================================================
+
+def simplify(expr):
+    """Returns a sum of products equivalent to expr, e.g. (p ^ q) v ~r
+
+    The sum has the fewest products, then literals, possible for most
+    small expressions, and is near that otherwise; see minimise.minimise.
+    """
+    import minimise # minimise imports logic
+    return minimise.minimise(expr)
 
 # =============================================================================
 # Truth Tables
@@ -404,35 +1743,245 @@ def bool_permutations(n):
             perms.append([value] + perm)
     return perms
 
+def bool_masks(n):
+    """Returns (masks, mask) for the truth table of n boolean values
+
+    Bit i of the kth mask in masks is the kth value in row i of
+    bool_permutations(n), and mask has a bit set for every row.
+    """
+    rows = 1 << n
+    mask = (1 << rows) - 1
+    masks = []
+    for k in range(n):
+        # blocks of `block` set bits alternate with blocks of unset bits
+        block = 1 << (n - k - 1)
+        bits, width = (1 << block) - 1, 2 * block
+        while width < rows:
+            bits |= bits << width
+            width *= 2
+        masks.append(bits)
+    return masks, mask
+
+# the values of the 8 bits of each byte, least significant first
+byte_values = [tuple(bool(byte >> i & 1) for i in range(8))
+               for byte in range(256)]
+
+class Column(object):
+    """A column of a truth table as a sequence of bools
+
+    The values are packed 8 to a byte, so a column of n rows takes n / 8
+    bytes rather than a list of n bools.
+    """
+
+    def __init__(self, bits, length):
+        # bits is an int, or its bytes packed already
+        if not isinstance(bits, bytes):
+            bits = bits.to_bytes((length + 7) // 8, 'little')
+        self.data = bits
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('truth table index out of range')
+        return bool(self.data[index >> 3] >> (index & 7) & 1)
+
+    def __iter__(self):
+        values = itertools.chain.from_iterable(map(byte_values.__getitem__,
+                                                   self.data))
+        return itertools.islice(values, self.length)
+
+    def __eq__(self, values):
+        try:
+            if len(values) != len(self):
+                return False
+        except TypeError:
+            return False
+        return all(a == b for a, b in zip(self, values))
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def bits(self):
+        return int.from_bytes(self.data, 'little')
+
+class Rows(object):
+    """The rows of a truth table, formatted only when they are read"""
+
+    def __init__(self, names, values):
+        self.names = names
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = self.values[index]
+        if index < 0:
+            index += len(self)
+        n = len(self.names)
+        row = [not index >> (n - i - 1) & 1 for i in range(n)]
+        return list(map(prettytable.cell_str, row + [value]))
+
+    def __iter__(self):
+        perms = itertools.product('TF', repeat=len(self.names))
+        for perm, value in zip(perms, self.values):
+            yield list(perm) + [prettytable.cell_str(value)]
+
+    def __eq__(self, rows):
+        try:
+            if len(rows) != len(self):
+                return False
+        except TypeError:
+            return False
+        return all(a == b for a, b in zip(self, rows))
+
+    def __repr__(self):
+        return repr(list(self))
+
 class TruthTable(prettytable.Table):
-    def __init__(self, expr):
+    """The truth table of an expression
+
+    Only the column of the expression's values is stored, packed into
+    bytes; the rows are formatted when the table is rendered.
+    """
+
+    def __init__(self, expr, values=None):
+        # values is the Column of the expression's values, if computed
         expr = parse(expr)
         names = expr.get_names()
         header = names + [str(expr)]
         super(TruthTable, self).__init__(header)
 
         self.expression = expr
-        self.values = []
+        self.names = names
+        if values is None:
+            bits, mask = expr.truth_bits(names)
+            values = Column(bits, mask.bit_length())
+        self.values = values
+        self.rows = Rows(names, self.values)
+
+# the number of variables in each block of rows in iter_truth_bits
+BLOCK_VARIABLES = 10
+
+def iter_truth_bits(expr, names=None):
+    """Yields (bits, mask) for each block of rows of the truth table of expr
+
+    As truth_bits, but for 2 ** BLOCK_VARIABLES rows at a time (or every
+    row, if there are fewer), in order, so memory use does not grow with
+    the size of the table and its computation can be stopped between
+    blocks.
+    """
+    expr = parse(expr)
+    if names is None:
+        names = expr.get_names()
+    reduced = DAG(rewrite(expr))
+
+    # the last variables vary within each block, the first between them
+    split = max(len(names) - BLOCK_VARIABLES, 0)
+    masks, mask = bool_masks(len(names) - split)
+    variables = dict(zip(names[split:], masks))
+
+    for perm in itertools.product((True, False), repeat=split):
+        for name, value in zip(names, perm):
+            variables[name] = mask if value else 0
+        yield reduced.evaluate_bits(variables, mask), mask
+
+def column_of_blocks(blocks):
+    """Returns the Column of the blocks of bits of iter_truth_bits"""
+    data, length = [], 0
+    for bits, mask in blocks:
+        # every block but a lone one has a multiple of 8 rows, so its
+        # bytes follow on from the last block's
+        rows = mask.bit_length()
+        data.append(bits.to_bytes((rows + 7) // 8, 'little'))
+        length += rows
+    return Column(b''.join(data), length)
+
+def iter_truth_table(expr, names=None):
+    """Yields each row of the truth table of expr, as in TruthTable
+
+    Rows are lists of the values of names (defaults to get_names()) then
+    the value of expr. Rows are computed in blocks rather than all at
+    once (see iter_truth_bits), so memory use does not grow with the size
+    of the table.
+    """
+    expr = parse(expr)
+    if names is None:
+        names = expr.get_names()
+    split = max(len(names) - BLOCK_VARIABLES, 0)
+    block_perms = bool_permutations(len(names) - split)
 
-        for perm in bool_permutations(len(names)):
-            variables = dict(zip(names, perm))
-            value = expr.evaluate(variables)
-            self.append(perm + [value])
-            self.values.append(value)
+    perms = itertools.product((True, False), repeat=split)
+    for perm, (bits, _) in zip(perms, iter_truth_bits(expr, names)):
+        perm = list(perm)
+        for i, block_perm in enumerate(block_perms):
+            yield perm + block_perm + [bool(bits >> i & 1)]
+
+def write_truth_table(expr, stream):
+    """Writes the truth table of expr to stream, one row at a time"""
+    expr = parse(expr)
+    header = expr.get_names() + [str(expr)]
+    prettytable.write_table(stream, header, iter_truth_table(expr))
 
 class TooManyVariablesError(Exception):
     pass
 
-def truth_table(expr):
+# the largest truth table truth_table will build, see estimate_truth_table
+MAX_ROWS = 2 ** 10
+MAX_SIZE = 2 ** 20
+
+def estimate_truth_table(expr):
+    """Returns (rows, size) of the truth table of expr
+
+    size is the number of characters in the rendered table.
+    """
     expr = parse(expr)
-    MAX_VARIABLES = 4
-    num_variables = len(expr.get_names())
-    if num_variables > MAX_VARIABLES:
+    header = expr.get_names() + [str(expr)]
+    rows = 2 ** (len(header) - 1)
+    # each cell is padded and separated by 3 characters, plus the edges
+    width = sum(len(cell) + 3 for cell in header) + 2
+    # the rows, the header, and the 3 borders
+    return rows, (rows + 4) * width
+
+def truth_table(expr, max_rows=None, max_size=None):
+    """Returns the TruthTable of expr, if it is within the limits
+
+    Raises TooManyVariablesError if the table has more than max_rows rows
+    or size characters, which default to MAX_ROWS and MAX_SIZE.
+    """
+    expr = parse(expr)
+    max_rows = MAX_ROWS if max_rows is None else max_rows
+    max_size = MAX_SIZE if max_size is None else max_size
+    rows, size = estimate_truth_table(expr)
+    if rows > max_rows or size > max_size:
         raise TooManyVariablesError(
-            '%s variables in expression, maximum of %d allowed'
-                % (num_variables, MAX_VARIABLES))
+            '%s variables in expression make %d rows (%d characters), '
+            'maximum of %d rows (%d characters) allowed'
+                % (len(expr.get_names()), rows, size, max_rows, max_size))
     return TruthTable(expr)
 
+def summarise(expr):
+    """Returns lines summarising the truth table of expr"""
+    expr = parse(expr)
+    rows, size = estimate_truth_table(expr)
+    lines = ['Variables: %d' % len(expr.get_names()),
+             'Rows: %d (%d characters)' % (rows, size),
+             DAG(expr).report()]
+    lines.append('Models: %d' % expr.count_models())
+    lines.append('Tautology: %s' % ('yes' if expr.is_tautology() else 'no'))
+    lines.append('Contradiction: %s'
+                 % ('yes' if expr.is_contradiction() else 'no'))
+    return lines
+
 # =============================================================================
 # Sample REPL
 # =============================================================================
@@ -451,8 +2000,16 @@ def repl(expr=None):
         try:
             tt = truth_table(expr)
         except TooManyVariablesError as e:
-            print('Cannot generate truth table:', e)
+            print('Cannot print truth table:', e)
+            print()
+            for line in summarise(expr):
+                print(line)
             print()
+            rows, _ = estimate_truth_table(expr)
+            answer = input('Stream all %d rows anyway? [y/N] ' % rows)
+            if answer.strip().lower() in ('y', 'yes'):
+                print('Truth table:')
+                write_truth_table(expr, sys.stdout)
         else:
             print('Truth table:')
             print(tt)
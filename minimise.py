@@ -0,0 +1,340 @@
+import bdd
+import logic
+from functools import reduce
+
+# =============================================================================
+# Two-Level Minimisation
+# =============================================================================
+
+# A cube is a product of literals as a pair of ints (value, care): bit k of
+# care is set if the kth variable is in the product, and bit k of value if
+# it is there unnegated. A cover is a list of cubes, true when any cube is.
+
+# the most variables minimised exactly, rather than by expand/irredundant
+EXACT_VARIABLES = 8
+
+# the most products of primes kept while applying Petrick's method
+PETRICK_PRODUCTS = 1024
+
+def bits(n):
+    """Generate each set bit of n, least significant first"""
+    while n:
+        bit = n & -n
+        yield bit
+        n ^= bit
+
+def literals(cube):
+    return bin(cube[1]).count('1')
+
+def cost(cover):
+    return len(cover), sum(map(literals, cover))
+
+def contains(outer, inner):
+    """Returns whether the cube outer is true wherever the cube inner is"""
+    value, care = outer
+    return care & ~inner[1] == 0 and inner[0] & care == value
+
+def cube_node(diagram, cube):
+    """Returns the BDD node of cube, variable k being at level k"""
+    value, care = cube
+    node = bdd.TRUE
+    for level in reversed(range(care.bit_length())):
+        if care >> level & 1:
+            if value >> level & 1:
+                node = diagram.node(level, bdd.FALSE, node)
+            else:
+                node = diagram.node(level, node, bdd.FALSE)
+    return node
+
+def implies(diagram, node, cube):
+    """Returns whether node is true wherever cube is"""
+    value, care = cube
+    seen, stack = set(), [node]
+    while stack:
+        node = stack.pop()
+        if node == bdd.FALSE:
+            return False
+        if node == bdd.TRUE or node in seen:
+            continue
+        seen.add(node)
+        level = diagram.var_levels[node]
+        if not care >> level & 1:
+            stack.append(diagram.lows[node])
+            stack.append(diagram.highs[node])
+        elif value >> level & 1:
+            stack.append(diagram.highs[node])
+        else:
+            stack.append(diagram.lows[node])
+    return True
+
+# -----------------------------------------------------------------------------
+# Exact: Quine-McCluskey and Petrick's method
+# -----------------------------------------------------------------------------
+
+def minterms(expr, names):
+    """Returns the rows of the truth table of expr in which it is true
+
+    Bit k of each row is the value of the kth name.
+    """
+    rows = 1 << len(names)
+    mask = (1 << rows) - 1
+    # bool_masks counts down from all true with the first name most
+    # significant, so complement its masks and take them in reverse
+    masks, _ = logic.bool_masks(len(names))
+    variables = dict((name, mask ^ masks[-1 - k])
+                     for k, name in enumerate(names))
+    # evaluated over a DAG, which walks expr with a stack, not recursion
+    bits = logic.DAG(expr).evaluate_bits(variables, mask)
+    return [row for row in range(rows) if bits >> row & 1]
+
+def prime_implicants(minterms, n):
+    """Returns the prime implicants of the function true at minterms"""
+    cubes = set((m, (1 << n) - 1) for m in minterms)
+    primes = []
+    while cubes:
+        # merge each pair of cubes differing in just one literal
+        merged, used = set(), set()
+        for value, care in cubes:
+            for bit in bits(care & ~value):
+                other = (value | bit, care)
+                if other in cubes:
+                    merged.add((value, care ^ bit))
+                    used.add((value, care))
+                    used.add(other)
+        primes.extend(cubes - used)
+        cubes = merged
+    return primes
+
+def absorb(sets):
+    """Returns the sets, as bitsets, that do not contain another set"""
+    kept = []
+    for s in sorted(set(sets), key=lambda s: bin(s).count('1')):
+        if not any(other & s == other for other in kept):
+            kept.append(s)
+    return kept
+
+def reduce_chart(primes, rows):
+    """Returns (essential, rows) for the prime implicant chart rows
+
+    Each row is a bitset of the primes covering a minterm. Essential
+    primes are selected, rows covered by them or containing another row
+    are dropped, and so are primes covering only rows a no more costly
+    prime covers, until the chart stops changing.
+    """
+    essential = 0
+    while True:
+        rows = absorb(row for row in rows if not row & essential)
+        single = [row for row in rows if row & (row - 1) == 0]
+        if single:
+            essential |= reduce(lambda a, b: a | b, single)
+            continue
+
+        # the rows covered by each prime left in the chart
+        covers = {}
+        for k, row in enumerate(rows):
+            for bit in bits(row):
+                covers[bit] = covers.get(bit, 0) | 1 << k
+        dominated = 0
+        by_cost = sorted(covers, key=lambda bit: literals(
+            primes[bit.bit_length() - 1]))
+        for i, bit in enumerate(by_cost):
+            for other in by_cost[:i]:
+                if not other & dominated and \
+                   covers[bit] & covers[other] == covers[bit]:
+                    dominated |= bit
+                    break
+        if not dominated:
+            return essential, rows
+        rows = [row & ~dominated for row in rows]
+
+def petrick(primes, minterms):
+    """Returns a cheapest selection of primes covering minterms
+
+    The chart is reduced first, then the cheapest product of the choices
+    left is found by Petrick's method. The products are cut down to the
+    PETRICK_PRODUCTS cheapest as they are multiplied, so huge charts are
+    covered well rather than exactly.
+    """
+    def selection(product):
+        return [primes[bit.bit_length() - 1] for bit in bits(product)]
+
+    rows = []
+    for m in minterms:
+        rows.append(sum(1 << i for i, (value, care) in enumerate(primes)
+                        if m & care == value))
+    essential, rows = reduce_chart(primes, rows)
+
+    products = [0]
+    for row in sorted(rows, key=lambda row: bin(row).count('1')):
+        multiplied = []
+        for product in products:
+            if product & row:
+                multiplied.append(product)
+            else:
+                multiplied.extend(product | bit for bit in bits(row))
+        products = absorb(multiplied)
+        if len(products) > PETRICK_PRODUCTS:
+            products.sort(key=lambda product: cost(selection(product)))
+            del products[PETRICK_PRODUCTS:]
+
+    best = min(products, key=lambda product: cost(selection(product)))
+    return selection(essential | best)
+
+def minimise_exact(expr, names):
+    """Returns a minimum cover of expr"""
+    ones = minterms(expr, names)
+    return petrick(prime_implicants(ones, len(names)), ones)
+
+# -----------------------------------------------------------------------------
+# Heuristic: expand and irredundant, as in Espresso
+# -----------------------------------------------------------------------------
+
+def isop(diagram, node):
+    """Returns an irredundant sum of products of node
+
+    This is Minato and Morreale's construction, which covers the BDD
+    without enumerating its paths, of which there can be exponentially
+    many.
+    """
+    results = {} # (lower, upper) -> (cover, node)
+
+    def cover(lower, upper):
+        # a cover true wherever lower is and false wherever upper is not
+        if lower == bdd.FALSE:
+            return [], bdd.FALSE
+        if upper == bdd.TRUE:
+            return [(0, 0)], bdd.TRUE
+        key = (lower, upper)
+        if key not in results:
+            level = min(diagram.var_levels[lower], diagram.var_levels[upper])
+            bit = 1 << level
+            lower0, lower1 = diagram.cofactors(lower, level)
+            upper0, upper1 = diagram.cofactors(upper, level)
+
+            # cubes needing the variable false, then true, then neither
+            cover0, node0 = cover(and_not(lower0, upper1), upper0)
+            cover1, node1 = cover(and_not(lower1, upper0), upper1)
+            rest = diagram.apply(bdd.OR, and_not(lower0, node0),
+                                 and_not(lower1, node1))
+            cover2, node2 = cover(rest, diagram.apply(bdd.AND, upper0, upper1))
+
+            cubes = [(value, care | bit) for value, care in cover0]
+            cubes += [(value | bit, care | bit) for value, care in cover1]
+            cubes += cover2
+            node = diagram.apply(bdd.OR, diagram.node(level, node0, node1),
+                                 node2)
+            results[key] = cubes, node
+        return results[key]
+
+    def and_not(u, v):
+        return diagram.apply(bdd.AND, u, diagram.apply(bdd.XOR, bdd.TRUE, v))
+
+    return cover(node, node)[0]
+
+def expand(diagram, node, cover):
+    """Returns cover with each cube made prime, dropping covered cubes
+
+    Larger cubes are expanded first, skipping those the expanded cubes
+    cover, and each cube drops first the literals that most of the other
+    cubes lack, which tends to make it cover them.
+    """
+    agree = {} # each literal -> the number of cubes it is in
+    for value, care in cover:
+        for bit in bits(care):
+            key = (bit, value & bit)
+            agree[key] = agree.get(key, 0) + 1
+
+    expanded, covered = [], bdd.FALSE
+    for cube in sorted(cover, key=literals):
+        if implies(diagram, covered, cube):
+            continue
+        value, care = cube
+        raise_order = sorted(bits(care),
+                             key=lambda bit: agree[(bit, value & bit)])
+        for bit in raise_order:
+            raised = (value & ~bit, care & ~bit)
+            if implies(diagram, node, raised):
+                value, care = raised
+        cube = (value, care)
+        expanded = [e for e in expanded if not contains(cube, e)]
+        expanded.append(cube)
+        covered = diagram.apply(bdd.OR, covered, cube_node(diagram, cube))
+    return expanded
+
+def irredundant(diagram, cover):
+    """Returns cover without the cubes covered by the other cubes
+
+    Cubes with the most literals are the first to be dropped.
+    """
+    cover = sorted(cover, key=literals, reverse=True)
+    nodes = [cube_node(diagram, cube) for cube in cover]
+
+    # rest[i] is the node of the cubes from i onwards
+    rest = [bdd.FALSE] * (len(cover) + 1)
+    for i in reversed(range(len(cover))):
+        rest[i] = diagram.apply(bdd.OR, nodes[i], rest[i + 1])
+
+    kept, node = [], bdd.FALSE
+    for i, cube in enumerate(cover):
+        others = diagram.apply(bdd.OR, node, rest[i + 1])
+        if not implies(diagram, others, cube):
+            kept.append(cube)
+            node = diagram.apply(bdd.OR, node, nodes[i])
+    return kept
+
+def minimise_heuristic(expr, names):
+    """Returns an irredundant cover of prime implicants of expr"""
+    # the BDD orders variables as they appear in expr, which tends to keep
+    # it small, so the cover is in that order until it is renumbered
+    function = bdd.from_expression(expr)
+    diagram, node = function.bdd, function.node
+    cover = irredundant(diagram, expand(diagram, node, isop(diagram, node)))
+
+    index = [names.index(name) for name in diagram.names]
+    def renumber(n):
+        return sum(1 << index[level] for level in range(len(index))
+                   if n >> level & 1)
+    return [(renumber(value), renumber(care)) for value, care in cover]
+
+# -----------------------------------------------------------------------------
+
+def to_expression(cover, names):
+    """Returns the sum of products of cover, naming variable k names[k]"""
+    def order(cube):
+        # products with earlier, unnegated names first
+        value, care = cube
+        return [2 - (care >> k & 1) - (value >> k & 1)
+                for k in range(len(names))]
+
+    products = []
+    for value, care in sorted(cover, key=order):
+        product = []
+        for k, name in enumerate(names):
+            if care >> k & 1:
+                var = logic.Var(name)
+                product.append(var if value >> k & 1 else logic.Not(var))
+        if not product:
+            return logic.T
+        products.append(product[0] if len(product) == 1
+                        else logic.And(*product))
+
+    if not products:
+        return logic.F
+    return products[0] if len(products) == 1 else logic.Or(*products)
+
+def minimise(expr):
+    """Returns a sum of products equivalent to expr
+
+    The sum is minimum, having the fewest products then literals, for
+    expressions of up to EXACT_VARIABLES variables, unless Petrick's
+    method has more than PETRICK_PRODUCTS products to choose between, when
+    it keeps the cheapest and the sum may be slightly above minimum.
+    Otherwise it is an irredundant sum of prime implicants.
+    """
+    expr = logic.parse(expr)
+    names = expr.get_names()
+    if len(names) <= EXACT_VARIABLES:
+        cover = minimise_exact(expr, names)
+    else:
+        cover = minimise_heuristic(expr, names)
+    return to_expression(cover, names)
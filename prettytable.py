@@ -1,3 +1,5 @@
+import io
+
 TOP, MIDDLE, BOTTOM = range(3)
 
 BORDER_H = '─'
@@ -28,6 +30,51 @@ def cell_str(cell):
     cell = tf.get(cell, cell)
     return str(cell)
 
+def render_border(column_widths, border_name):
+    row = list(map(lambda w: BORDER_H * w, column_widths))
+    return render_row(row, border_name)
+
+def render_row(row, border_name=None):
+    left, right = get_sides(border_name)
+    row = get_separator(border_name).join(row)
+    return left + row + right + '\n'
+
+def pad_cell(cell, width):
+    cell = ' ' * ((width - len(cell)) // 2) + cell
+    return cell + ' ' * (width - len(cell))
+
+def pad_cells(row, column_widths):
+    return [pad_cell(cell, width) for cell, width in zip(row, column_widths)]
+
+def write_table(stream, header, rows, column_widths=None):
+    """Writes a table to stream, one row at a time
+
+    column_widths defaults to the widths of the header cells, so rows
+    are never held in memory, but no cell may be wider than its header.
+    """
+    header = list(map(cell_str, header))
+    if column_widths is None:
+        column_widths = list(map(len, header))
+
+    stream.write(render_border(column_widths, TOP))
+    stream.write(render_row(pad_cells(header, column_widths)))
+    stream.write(render_border(column_widths, MIDDLE))
+
+    # T and F padded to each column's width up front, so rows of bools,
+    # e.g. those of truth tables, are rendered by joining ready-made cells
+    padded = [{True: pad_cell('T', width), False: pad_cell('F', width)}
+              for width in column_widths]
+    left, right = get_sides(None)
+    right += '\n'
+    separator = get_separator(None)
+    for row in rows:
+        try:
+            cells = [column[cell] for column, cell in zip(padded, row)]
+        except (KeyError, TypeError):
+            cells = pad_cells(map(cell_str, row), column_widths)
+        stream.write(left + separator.join(cells) + right)
+    stream.write(render_border(column_widths, BOTTOM))
+
 class Table(object):
     def __init__(self, header):
         self.header = list(map(cell_str, header))
@@ -37,40 +84,37 @@ class Table(object):
         self.update()
 
     def __str__(self):
-        output = ''
-        output += self.render_border(TOP)
-        output += self.render_row(self.pad_cells(self.header))
-        output += self.render_border(MIDDLE)
-        for row in self.rows:
-            row = self.pad_cells(row)
-            output += self.render_row(row)
-        output += self.render_border(BOTTOM)
-        return output
+        stream = io.StringIO()
+        self.write(stream)
+        return stream.getvalue()
 
     def append(self, row):
         if len(row) != self.width:
             raise Exception
         row = list(map(cell_str, row))
         self.rows.append(row)
-        self.update()
+
+        # only the new row can widen the columns
+        widths = self.column_widths
+        for i, cell in enumerate(row):
+            if len(cell) > widths[i]:
+                widths[i] = len(cell)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def write(self, stream):
+        write_table(stream, self.header, self.rows, self.column_widths)
 
     def render_border(self, border_name):
-        row = list(map(lambda w: BORDER_H * w, self.column_widths))
-        return self.render_row(row, border_name)
+        return render_border(self.column_widths, border_name)
 
     def render_row(self, row, border_name=None):
-        left, right = get_sides(border_name)
-        row = get_separator(border_name).join(row)
-        return left + row + right + '\n'
+        return render_row(row, border_name)
 
     def pad_cells(self, row):
-        row = list(row)
-        for i, cell in enumerate(row):
-            width = self.column_widths[i]
-            cell = ' ' * ((width - len(cell)) // 2) + cell
-            cell = cell + ' ' * (width - len(cell))
-            row[i] = cell
-        return row
+        return pad_cells(row, self.column_widths)
 
     def update(self):
         widths = list(map(len, self.header))
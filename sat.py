@@ -0,0 +1,249 @@
+from heapq import heappush, heappop, heapify
+
+# =============================================================================
+# CDCL SAT Solver
+# =============================================================================
+
+# A literal is a nonzero int: k stands for the kth variable, -k for its
+# negation. A clause is a list of literals, true when any literal is true.
+
+DECAY = 0.95
+RESTART_INTERVAL = 100
+RESTART_GROWTH = 1.5
+
+class Solver(object):
+    """Conflict-driven clause learning solver for clauses of literals
+
+    Clauses can be added between calls to solve, e.g. to block models
+    that have already been found.
+    """
+
+    def __init__(self, clauses=(), num_vars=0):
+        self.num_vars = 0
+        self.values = [0] # per variable: 1 (true), -1 (false) or 0
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phases = [False]
+        self.watches = {}
+        self.trail = []
+        self.trail_lim = []
+        self.head = 0
+        self.heap = []
+        self.increment = 1.0
+        self.ok = True
+        self.model = None
+
+        self.ensure(num_vars)
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def ensure(self, num_vars):
+        # make room for variables up to num_vars
+        while self.num_vars < num_vars:
+            self.num_vars += 1
+            var = self.num_vars
+            self.values.append(0)
+            self.levels.append(0)
+            self.reasons.append(None)
+            self.activity.append(0.0)
+            self.phases.append(False)
+            self.watches[var] = []
+            self.watches[-var] = []
+            heappush(self.heap, (0.0, var))
+
+    def value(self, lit):
+        value = self.values[abs(lit)]
+        return value if lit > 0 else -value
+
+    def add_clause(self, clause):
+        """Adds a clause, returning False if the clauses are unsatisfiable"""
+        if not self.ok:
+            return False
+        self.backtrack(0)
+        self.ensure(max(map(abs, clause)) if clause else 0)
+
+        lits = []
+        for lit in clause:
+            value = self.value(lit)
+            # already satisfied, or a tautology
+            if value == 1 or -lit in lits:
+                return True
+            if value == 0 and lit not in lits:
+                lits.append(lit)
+
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self.assign(lits[0], None)
+            self.ok = self.propagate() is None
+        else:
+            self.attach(lits)
+        return self.ok
+
+    def attach(self, clause):
+        # the first two literals of each clause are watched
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def assign(self, lit, reason):
+        var = abs(lit)
+        self.values[var] = 1 if lit > 0 else -1
+        self.levels[var] = len(self.trail_lim)
+        self.reasons[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        # returns a conflicting clause, or None
+        while self.head < len(self.trail):
+            false_lit = -self.trail[self.head]
+            self.head += 1
+            watchers = self.watches[false_lit]
+            self.watches[false_lit] = kept = []
+
+            for i, clause in enumerate(watchers):
+                # keep the false literal second
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if self.value(first) == 1:
+                    kept.append(clause)
+                    continue
+
+                # look for another literal to watch
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) != -1:
+                        clause[1], clause[k] = clause[k], false_lit
+                        self.watches[clause[1]].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if self.value(first) == -1:
+                        kept.extend(watchers[i + 1:])
+                        return clause
+                    self.assign(first, clause)
+        return None
+
+    def analyze(self, conflict):
+        # learn the first unique implication point clause of the conflict
+        level = len(self.trail_lim)
+        learnt = [None]
+        seen = set()
+        counter = 0
+        lit = None
+        clause = conflict
+        index = len(self.trail) - 1
+
+        while True:
+            for q in clause:
+                var = abs(q)
+                if q == lit or var in seen or self.levels[var] == 0:
+                    continue
+                seen.add(var)
+                self.bump(var)
+                if self.levels[var] == level:
+                    counter += 1
+                else:
+                    learnt.append(q)
+
+            # the next literal on the trail involved in the conflict
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            counter -= 1
+            if counter == 0:
+                break
+            clause = self.reasons[abs(lit)]
+
+        learnt[0] = -lit
+        if len(learnt) == 1:
+            return learnt, 0
+
+        # watch the literal from the highest level after backtracking
+        i = max(range(1, len(learnt)),
+                key=lambda i: self.levels[abs(learnt[i])])
+        learnt[1], learnt[i] = learnt[i], learnt[1]
+        return learnt, self.levels[abs(learnt[1])]
+
+    def bump(self, var):
+        self.activity[var] += self.increment
+        if self.activity[var] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.increment *= 1e-100
+            self.heap = [(-self.activity[v], v)
+                         for v in range(1, self.num_vars + 1)
+                         if self.values[v] == 0]
+            heapify(self.heap)
+
+    def backtrack(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        for lit in self.trail[start:]:
+            var = abs(lit)
+            self.values[var] = 0
+            self.reasons[var] = None
+            self.phases[var] = lit > 0
+            heappush(self.heap, (-self.activity[var], var))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.head = start
+
+        # drop stale heap entries once they outnumber the variables
+        if len(self.heap) > 4 * self.num_vars:
+            self.heap = [(-self.activity[v], v)
+                         for v in range(1, self.num_vars + 1)
+                         if self.values[v] == 0]
+            heapify(self.heap)
+
+    def decide(self):
+        # the unassigned variable with the highest activity, or None
+        while self.heap:
+            _, var = heappop(self.heap)
+            if self.values[var] == 0:
+                return var
+        return None
+
+    def solve(self):
+        """Returns True if the clauses are satisfiable, setting model
+
+        model is a list of each variable's value, indexed by variable
+        """
+        self.model = None
+        if not self.ok:
+            return False
+        self.backtrack(0)
+        if self.propagate() is not None:
+            self.ok = False
+            return False
+
+        conflicts, restart = 0, RESTART_INTERVAL
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.attach(learnt)
+                    self.assign(learnt[0], learnt)
+                self.increment /= DECAY
+                conflicts += 1
+                continue
+
+            if conflicts >= restart:
+                conflicts, restart = 0, int(restart * RESTART_GROWTH)
+                self.backtrack(0)
+                continue
+
+            var = self.decide()
+            if var is None:
+                self.model = [value > 0 for value in self.values]
+                return True
+            self.trail_lim.append(len(self.trail))
+            self.assign(var if self.phases[var] else -var, None)
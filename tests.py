@@ -1,9 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from functools import reduce
 from logic import *
+from prettytable import Table, cell_str
+import bdd
+import circuit
+import io
+import itertools
+import sys
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 p, q, r, s = Var('p'), Var('q'), Var('r'), Var('s')
 
 N = Not
@@ -24,6 +36,17 @@ Xpq              = X(p, q)
 Cpq              = C(p, q)
 Epq, Epqr, Epqrs = E(p, q), E(p, q, r), E(p, q, r, s)
 
+Maj = operation('Maj', lambda *v: sum(v) * 2 > len(v), 'MAJ')
+
+# the values of each evaluation of Counted, e.g. to count them
+counted_calls = []
+
+def counted_rule(*values):
+    counted_calls.append(values)
+    return all(values)
+
+Counted = operation('Counted', counted_rule, 'COUNTED')
+
 # =============================================================================
 # Expression
 # =============================================================================
@@ -109,11 +132,16 @@ class TestExpressionMethods(unittest.TestCase):
         self.assertFalse(Cpq.equivalent(C(r, s)))
         self.assertFalse(Apq.equivalent(Opq))
         self.assertTrue(p != q)
-        self.assertTrue(p == N(Np))
         self.assertTrue(p == p == p)
         self.assertTrue(A(p, q) == A(p, q) == Apq)
         self.assertFalse(p == q)
 
+        # == compares structure, so equivalent expressions may differ
+        self.assertFalse(p == N(Np))
+        self.assertFalse(Apq == A(q, p))
+        self.assertTrue(intern(Apq) == A(p, q))
+        self.assertEqual(len({p, N(Np), Var('p')}), 2)
+
     def test_evaluate(self):
         tt = {'p': True, 'q': True}
         tf = {'p': True, 'q': False}
@@ -203,6 +231,328 @@ class TestExpressionMethods(unittest.TestCase):
         self.assertEqual(C(A(Cpq, p), q).evaluate(ft), True)
         self.assertEqual(C(A(Cpq, p), q).evaluate(ff), True)
 
+    def test_compile(self):
+        exprs = [p, T, F, Np, N(Np), Apqr, Opqr, Jpq, Dpq, Xpq, Cpq, Epqrs,
+                 C(A(Cpq, p), q), O(J(p, N(q)), D(p, q, r), X(r, s, N(T)))]
+        for expr in exprs:
+            names = expr.get_names()
+            evaluate = expr.compile()
+            for perm in bool_permutations(len(names)):
+                self.assertEqual(evaluate(perm),
+                                 expr.evaluate(dict(zip(names, perm))))
+        self.assertEqual(Cpq.compile(['q', 'p'])((True, False)), True)
+        self.assertEqual(Cpq.compile(['q', 'p'])((False, True)), False)
+
+        # deep expressions compile to flat code without recursing
+        xs = [Var('x%d' % i) for i in range(3000)]
+        deep = reduce(J, xs)
+        self.assertEqual(deep.get_names(), sorted(x.name for x in xs))
+        self.assertEqual(deep.compile()([False] * 2999 + [True]), True)
+        self.assertEqual(deep.compile()([False] * 3000), False)
+
+    def test_compile_custom_operation(self):
+        expr = Maj(p, q, Nr)
+        evaluate = expr.compile()
+        self.assertEqual(evaluate((True, True, True)), True)
+        self.assertEqual(evaluate((True, False, True)), False)
+        self.assertEqual(evaluate((False, False, False)), False)
+        self.assertEqual(evaluate((True, False, False)), True)
+
+    def test_truth_bits(self):
+        exprs = [p, T, F, Np, Apqr, Opqr, Jpq, Dpq, Xpq, Cpq, Epqrs,
+                 C(A(Cpq, p), q), O(J(p, N(q)), D(p, q, r), X(r, s, N(T)))]
+        for expr in exprs:
+            names = expr.get_names()
+            bits, mask = expr.truth_bits()
+            self.assertEqual(mask, 2 ** 2 ** len(names) - 1)
+            for i, perm in enumerate(bool_permutations(len(names))):
+                self.assertEqual(bool(bits >> i & 1),
+                                 expr.evaluate(dict(zip(names, perm))))
+
+        self.assertEqual(Maj(p, q, r).truth_bits(), (0b00010111, 0xff))
+        self.assertEqual(Apq.truth_bits(['q', 'r', 'p']), (0b00000101, 0xff))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_evaluate_batch(self):
+        exprs = [p, T, F, Np, Apqr, Opqr, Jpq, Dpq, Xpq, Cpq, Epqrs,
+                 C(A(Cpq, p), q), O(J(p, N(q)), D(p, q, r), X(r, s, N(T)))]
+        perms = numpy.array(bool_permutations(4))
+        columns = dict(zip('pqrs', perms.T))
+        for expr in exprs:
+            expected = [expr.evaluate(dict(zip('pqrs', perm)))
+                        for perm in perms]
+            self.assertEqual(expr.evaluate_batch(columns).tolist(), expected)
+            self.assertEqual(expr.evaluate_batch(perms, 'pqrs').tolist(),
+                             expected)
+
+        expr = Maj(p, q, Nr)
+        expected = [expr.evaluate(dict(zip('pqrs', perm))) for perm in perms]
+        self.assertEqual(expr.evaluate_batch(perms, 'pqrs').tolist(), expected)
+        self.assertEqual(T.evaluate_batch({}).tolist(), True)
+
+    def test_count_models(self):
+        self.assertEqual(p.count_models(), 1)
+        self.assertEqual(T.count_models(), 1)
+        self.assertEqual(F.count_models(), 0)
+        self.assertEqual(Apq.count_models(), 1)
+        self.assertEqual(Opqr.count_models(), 7)
+        self.assertEqual(Cpq.count_models(), 3)
+        self.assertEqual(O(p, Np).count_models(), 2)
+        self.assertEqual(Apq.count_models(['p', 'q', 'r', 's']), 4)
+        self.assertEqual(T.count_models(['p', 'q']), 4)
+        self.assertEqual(O(p, A(q, Nq)).count_models(['p']), 1)
+        self.assertRaises(ValueError, Apq.count_models, ['p'])
+
+        xs = [Var('x%d' % i) for i in range(200)]
+        expr = A(*[O(xs[i], xs[i + 1], xs[i + 2]) for i in range(198)])
+        counts = [1, 2, 4]
+        for _ in range(198):
+            # x[i] v x[i+1] v x[i+2] for every i means no 3 false in a row
+            counts.append(counts[-1] + counts[-2] + counts[-3])
+        self.assertEqual(expr.count_models(), counts[-1])
+
+    def test_satisfy(self):
+        self.assertEqual(Apq.satisfy(), {'p': True, 'q': True})
+        self.assertEqual(A(p, Nq).satisfy(), {'p': True, 'q': False})
+        self.assertEqual(A(p, Np).satisfy(), None)
+        self.assertEqual(T.satisfy(), {})
+        self.assertEqual(F.satisfy(), None)
+        for expr in [Opqr, Jpq, Dpq, Xpq, Cpq, Epqrs, C(A(Cpq, p), q)]:
+            self.assertTrue(expr.evaluate(expr.satisfy()))
+
+        self.assertEqual(A(Maj(p, q, r), Np, Nq).satisfy(), None)
+        self.assertEqual(A(Maj(p, q, r), Np).satisfy(),
+                         {'p': False, 'q': True, 'r': True})
+
+    def test_iter_models(self):
+        def models(expr, names=None):
+            models = expr.iter_models(names)
+            return sorted(sorted(model.items()) for model in models)
+
+        self.assertEqual(models(Opq), [
+            [('p', False), ('q', True)],
+            [('p', True), ('q', False)],
+            [('p', True), ('q', True)],
+        ])
+        self.assertEqual(models(A(p, Np)), [])
+        self.assertEqual(models(T), [[]])
+        self.assertEqual(models(O(Apq, r), ['p']), [[('p', False)],
+                                                   [('p', True)]])
+        self.assertEqual(models(Apq, ['p', 'q', 'r']), [
+            [('p', True), ('q', True), ('r', False)],
+            [('p', True), ('q', True), ('r', True)],
+        ])
+        self.assertEqual(models(Opqr, []), [[]])
+        for expr in [Opqr, Jpq, Dpq, Xpq, Cpq, Epqrs, C(A(Cpq, p), r)]:
+            self.assertEqual(len(models(expr)), expr.count_models())
+
+        xs = [Var('x%d' % i) for i in range(300)]
+        expr = A(J(xs[0], xs[1]), *xs[2:])
+        found = list(expr.iter_models())
+        self.assertEqual(len(found), 2)
+        self.assertTrue(all(expr.evaluate(model) for model in found))
+
+        models = O(*xs).iter_models()
+        self.assertTrue(O(*xs).evaluate(next(models)))
+
+    def test_counterexample(self):
+        self.assertEqual(Cpq.counterexample(), {'p': True, 'q': False})
+        self.assertEqual(O(p, Np).counterexample(), None)
+        self.assertEqual(Cpq.counterexample(O(Np, q)), None)
+        self.assertIn(Apq.counterexample(Opq), [{'p': True, 'q': False},
+                                                {'p': False, 'q': True}])
+        for expr in [Opqr, Jpq, Dpq, Xpq, Epqrs, C(A(Cpq, p), r)]:
+            self.assertFalse(expr.evaluate(expr.counterexample()))
+
+    def test_many_variables(self):
+        xs = [Var('x%d' % i) for i in range(300)]
+        self.assertTrue(A(*xs).equivalent(N(O(*map(N, xs)))))
+        self.assertTrue(C(A(*xs), O(*xs)).is_tautology())
+        self.assertTrue(A(O(*xs), N(xs[0]), *map(N, xs[1:])).is_contradiction())
+
+        left = reduce(lambda a, b: J(a, b), xs[:30])
+        right = reduce(lambda a, b: J(b, a), xs[:30])
+        self.assertTrue(left.equivalent(right))
+        self.assertFalse(left.equivalent(N(right)))
+
+    def test_hash(self):
+        # deep expressions do not overflow the stack
+        left, right = p, p
+        for _ in range(5000):
+            left, right = A(N(left), q), A(N(right), q)
+        self.assertEqual(hash(left), hash(right))
+        self.assertEqual(left, right)
+        self.assertNotEqual(left, A(N(right), q))
+
+        self.assertEqual(hash(A(p, q)), hash(Apq))
+        self.assertEqual(hash(N(Var('p'))), hash(Np))
+        self.assertEqual(hash(intern(Apqr)), hash(Apqr))
+        self.assertNotEqual(hash(Apq), hash(A(q, p)))
+        self.assertNotEqual(hash(Apq), hash(Opq))
+        self.assertEqual(len({Apq, A(p, q), Opq, Var('p'), p}), 3)
+
+    def test_intern(self):
+        expr = intern(O(A(p, q), N(A(p, q)), Var('p')))
+        self.assertTrue(expr.identical(O(Apq, N(Apq), p)))
+        self.assertTrue(expr.frozen)
+        self.assertTrue(expr.interned)
+        self.assertIs(expr[0], expr[1].term)
+        self.assertIs(expr[0][0], expr[2])
+        self.assertIs(intern('(p ^ q) v ~(p ^ q) v p'), expr)
+        self.assertIs(intern(expr), expr)
+        self.assertIsNot(intern(A(q, p)), expr[0])
+        self.assertFalse(expr.identical(intern(Apq)))
+        self.assertFalse(Apq.frozen)
+
+        rules = [intern('p ^ q'), intern('p&q'), intern('q ^ p'),
+                 intern('p ^ q'), intern('~p')]
+        self.assertEqual(len(set(rules)), 3)
+
+        self.assertFalse(hasattr(expr, '__dict__'))
+        self.assertFalse(hasattr(p, '__dict__'))
+
+    def test_rewrite(self):
+        rewrites = [
+            (A(p, A(q, r)), Apqr), (O(O(p, q), O(r, s)), Opqrs),
+            (E(p, E(q, r)), Epqr), (N(N(p)), p), (N(N(N(p))), Np),
+            (A(p, T, q), Apq), (A(p, F), F), (O(p, F), p), (O(T, p), T),
+            (A(p, p, q, p), Apq), (O(p, Np), T), (A(Np, q, p), F),
+            (A(p, Opq), p), (O(p, A(q, p)), p), (A(Opq, O(p, q, r)), Opq),
+            (D(p, T), Np), (D(p, F), T), (X(p, p), Np), (X(F, F), T),
+            (J(p, T), Np), (J(F, p), p), (J(p, p), F), (C(p, p), T),
+            (C(F, p), T), (C(T, p), p), (C(p, F), Np), (C(p, T), T),
+            (E(p, T), p), (E(p, F), Np), (E(p, q, p), q), (E(p, p), T),
+            (E(T, F), F), (N(A(T, F)), T), (A(N(N(p)), O(T, q)), p),
+        ]
+        for expr, expected in rewrites:
+            self.assertTrue(rewrite(expr).identical(expected), str(expr))
+            self.assertTrue(rewrite(expr).interned)
+
+        self.assertTrue(rewrite(Maj(T, F, N(F))).identical(T))
+        self.assertTrue(rewrite(Maj(T, N(N(p)), q)).identical(Maj(T, p, q)))
+
+        # the rewritten terms are shared
+        expr = rewrite(O(A(p, T), C(T, p), N(N(p))))
+        self.assertIs(expr, rewrite(p))
+        expr = rewrite(A(O(A(N(N(p)), q), r), N(A(p, T, q))))
+        self.assertIs(expr[0][0], expr[1].term)
+
+        # deep expressions do not overflow the stack
+        expr = p
+        for _ in range(5000):
+            expr = A(N(N(expr)), T)
+        self.assertIs(rewrite(expr), rewrite(p))
+
+        # wide nodes absorb only the terms they should
+        xs = [Var('x%d' % i) for i in range(2000)]
+        expr = rewrite(O(*[A(p, x) for x in xs] + [p, A(q, r), A(q, r, s)]))
+        self.assertTrue(expr.identical(O(p, A(q, r))))
+        expr = rewrite(A(*[O(x, y) for x, y in zip(xs, xs[1:])]))
+        self.assertEqual(len(expr), 1999)
+        self.assertTrue(rewrite(A(Opq, Opq)).identical(Opq))
+
+    def test_rewrite_truth_table(self):
+        # the truth table keeps the names and header of the expression
+        expr = O(A(p, F), C(q, q), r)
+        self.assertEqual(expr.truth_bits(), (0xff, 0xff))
+        self.assertEqual(expr.compile()((False, False, False)), True)
+        tt = TruthTable(expr)
+        self.assertEqual(tt.header, ['p', 'q', 'r', str(expr)])
+        self.assertEqual(list(tt.values), [True] * 8)
+        self.assertEqual(list(iter_truth_table(A(p, F))),
+                         [[True, False], [False, False]])
+
+    def test_restrict(self):
+        restricts = [
+            (O(A(p, q), r), {'p': True}, O(q, r)),
+            (O(A(p, q), r), {'p': False}, r),
+            (O(A(p, q), r), {'r': True}, T),
+            (C(p, A(q, r)), {'q': False}, Np),
+            (E(p, q, r), {'q': True, 'r': False}, Np),
+            (J(p, q), {'s': True}, J(p, q)),
+            (A(p, q), {}, Apq),
+        ]
+        for expr, values, expected in restricts:
+            self.assertTrue(expr.restrict(values).identical(expected),
+                            str(expr))
+            self.assertTrue(expr.restrict(values).interned)
+
+        expr = O(A(p, q), J(N(p), r), C(s, q))
+        names = expr.get_names()
+        for perm in bool_permutations(len(names)):
+            values = dict(zip(names, perm))
+            restricted = expr.restrict({'p': values['p'], 'q': values['q']})
+            self.assertEqual(restricted.evaluate(values),
+                             expr.evaluate(values))
+
+    def test_evaluate_partial(self):
+        decided = [
+            (Apq, {'p': False}, False), (Opqrs, {'r': True}, True),
+            (D(p, q), {'q': False}, True), (X(p, q), {'p': True}, False),
+            (C(p, q), {'p': False}, True), (C(p, q), {'q': True}, True),
+            (O(A(p, q), r), {'p': False, 'r': False}, False),
+            (O(A(p, q), N(r)), {'p': True, 'q': True}, True),
+            (A(J(p, q), r), {'r': False}, False),
+        ]
+        for expr, variables, expected in decided:
+            self.assertEqual(expr.evaluate(variables), expected, str(expr))
+
+        undecided = [
+            (Apq, {'p': True}), (Opqrs, {'p': False}), (J(p, q), {'p': True}),
+            (E(p, q), {}), (C(p, q), {'p': True}), (N(p), {'q': True}),
+        ]
+        for expr, variables in undecided:
+            self.assertRaises(KeyError, expr.evaluate, variables)
+
+        # custom operations without a partial rule try the unknown values
+        self.assertEqual(Maj(p, q, r).evaluate({'p': True, 'r': True}), True)
+        self.assertRaises(KeyError, Maj(p, q, r).evaluate, {'p': True})
+
+    def test_postorder(self):
+        shared = A(p, q)
+        expr = O(shared, N(shared), p)
+        self.assertEqual([str(t) for t in postorder(expr)],
+                         ['p', 'q', 'p ∧ q', '¬(p ∧ q)', str(expr)])
+        self.assertEqual(list(postorder(expr, lambda t: t is shared)),
+                         [expr[1], p, expr])
+
+        # deep expressions are walked without recursing
+        deep = p
+        for _ in range(5000):
+            deep = N(deep)
+        self.assertEqual(len(list(postorder(deep))), 5001)
+
+    def test_dag(self):
+        shared = A(O(p, q), N(r))
+        expr = O(A(shared, s), C(shared, p), J(shared, N(A(O(p, q), N(r)))))
+        dag = DAG(expr)
+        self.assertEqual(dag.tree_size, 31)
+        self.assertEqual(len(dag), 12)
+        self.assertEqual(dag.report(), 'Nodes: 31 (12 distinct)')
+        self.assertIs(dag.nodes[-1], dag.expression)
+
+        names = expr.get_names()
+        for perm in bool_permutations(len(names)):
+            variables = dict(zip(names, perm))
+            self.assertEqual(dag.evaluate(variables), expr.evaluate(variables))
+        masks, mask = bool_masks(len(names))
+        self.assertEqual(dag.evaluate_bits(dict(zip(names, masks)), mask),
+                         expr.truth_bits()[0])
+
+        # each distinct term is evaluated once
+        del counted_calls[:]
+        expr = O(*[A(Counted(p, q), r) for _ in range(10)])
+        DAG(expr).evaluate({'p': True, 'q': True, 'r': False})
+        self.assertEqual(len(counted_calls), 1)
+        expr.evaluate({'p': True, 'q': True, 'r': False})
+        self.assertEqual(len(counted_calls), 11)
+        expr.truth_bits()
+        self.assertEqual(len(counted_calls), 11 + 8)
+
+        # and compiled once
+        evaluate = O(J(shared, s), A(shared, p)).compile()
+        self.assertEqual(evaluate.source.count(' or '), 2)
+
     def test_identical(self):
         self.assertTrue(T.identical(T))
         self.assertTrue(F.identical(F))
@@ -220,6 +570,18 @@ class TestExpressionMethods(unittest.TestCase):
         self.assertTrue(C(A(Cpq, p), p).is_tautology())
         self.assertTrue(O(p, Np).is_tautology())
         self.assertTrue(E(E(p, q, r), E(E(p, q), r)).is_tautology())
+        self.assertFalse(Cpq.is_tautology())
+
+        xs = [Var('x%d' % i) for i in range(20)]
+        self.assertTrue(C(A(*xs), O(*xs)).is_tautology())
+        self.assertFalse(C(O(*xs), A(*xs)).is_tautology())
+
+        # deep expressions are encoded without recursing once per level
+        xs = [Var('x%d' % i) for i in range(3000)]
+        deep = reduce(A, xs)
+        self.assertFalse(deep.is_tautology())
+        self.assertTrue(deep.satisfy())
+        self.assertFalse(deep.equivalent(O(deep, xs[0])))
 
     def test_contradiction(self):
         self.assertTrue(F.is_contradiction())
@@ -267,6 +629,13 @@ class TestBinaryOperations(unittest.TestCase):
 # =============================================================================
 
 class TestTruthTable(unittest.TestCase):
+    def test_bool_masks(self):
+        for n in range(5):
+            masks, mask = bool_masks(n)
+            self.assertEqual(mask, 2 ** 2 ** n - 1)
+            for i, perm in enumerate(bool_permutations(n)):
+                self.assertEqual([bool(m >> i & 1) for m in masks], perm)
+
     def test_values(self):
         tt_p = TruthTable(p)
         tt_Apq = TruthTable(Apq)
@@ -309,6 +678,572 @@ class TestTruthTable(unittest.TestCase):
         self.assertEqual(tt_Apqr.values, [t, f, f, f, f, f, f, f])
         self.assertEqual(tt_Cpq.values, [t, f, t, t])
 
+    def test_compact(self):
+        xs = [Var('x%d' % i) for i in range(20)]
+        expr = C(A(*xs[:10]), O(*xs[10:]))
+        table = TruthTable(expr)
+        self.assertEqual(len(table.values.data), 2 ** 20 // 8)
+        self.assertEqual(len(table.values), 2 ** 20)
+        self.assertEqual(len(table.rows), 2 ** 20)
+
+        names = expr.get_names()
+        bits, _ = expr.truth_bits()
+        self.assertEqual(table.values.bits(), bits)
+        for i in [0, 1, 2 ** 19 - 1, 2 ** 19, 2 ** 20 - 1, -1]:
+            perm = [not (i % 2 ** 20) >> (19 - k) & 1 for k in range(20)]
+            value = expr.evaluate(dict(zip(names, perm)))
+            self.assertEqual(table.values[i], value)
+            self.assertEqual(table.rows[i], list(map(cell_str, perm + [value])))
+        self.assertEqual(sum(table.values), bin(bits).count('1'))
+        self.assertRaises(IndexError, lambda: table.values[2 ** 20])
+
+        table = TruthTable(Apq)
+        self.assertEqual(table.values[1:], [False] * 3)
+        self.assertEqual(table.rows[::3], [['T', 'T', 'T'], ['F', 'F', 'F']])
+        self.assertNotEqual(table.values, [True, False, False])
+
+    def test_truth_table_limits(self):
+        self.assertEqual(estimate_truth_table(Apq), (4, 8 * 18))
+        self.assertEqual(estimate_truth_table(T), (1, 5 * 6))
+        self.assertEqual(len(str(truth_table(Apq))), 8 * 18)
+        self.assertEqual(len(str(truth_table(Epqrs))),
+                         estimate_truth_table(Epqrs)[1])
+
+        xs = [Var('x%d' % i) for i in range(11)]
+        self.assertRaises(TooManyVariablesError, truth_table, A(*xs))
+        self.assertRaises(TooManyVariablesError, truth_table, Apqr, 4)
+        self.assertRaises(TooManyVariablesError, truth_table, Apqr, None, 100)
+        self.assertEqual(len(truth_table(A(*xs), 2 ** 11).rows), 2 ** 11)
+
+    def test_summarise(self):
+        self.assertEqual(summarise(Cpq), [
+            'Variables: 2',
+            'Rows: 4 (144 characters)',
+            'Nodes: 3 (3 distinct)',
+            'Models: 3',
+            'Tautology: no',
+            'Contradiction: no',
+        ])
+        xs = [Var('x%d' % i) for i in range(30)]
+        expr = O(A(*xs), N(xs[0]))
+        width = 10 * 2 + 20 * 3 + 30 * 3 + len(str(expr)) + 3 + 2
+        self.assertEqual(summarise(expr), [
+            'Variables: 30',
+            'Rows: 1073741824 (%d characters)' % ((2 ** 30 + 4) * width),
+            'Nodes: 34 (33 distinct)',
+            'Models: %d' % (2 ** 29 + 1),
+            'Tautology: no',
+            'Contradiction: no',
+        ])
+
+    def test_iter_truth_table(self):
+        exprs = [p, T, Apqr, Cpq, O(J(p, N(q)), D(p, q, r), X(r, s, N(T)))]
+        for expr in exprs:
+            table = TruthTable(expr)
+            rows = [list(map(cell_str, row)) for row in iter_truth_table(expr)]
+            self.assertEqual(rows, table.rows)
+
+            stream = io.StringIO()
+            write_truth_table(expr, stream)
+            self.assertEqual(stream.getvalue(), str(table))
+
+        xs = [Var('x%d' % i) for i in range(14)]
+        expr = J(A(*xs[:7]), O(*xs[7:]))
+        rows = iter_truth_table(expr)
+        for i, perm in enumerate(itertools.product((True, False), repeat=14)):
+            row = next(rows)
+            self.assertEqual(row[:-1], list(perm))
+            self.assertEqual(row[-1], expr.evaluate(dict(zip(expr.get_names(), perm))))
+        self.assertRaises(StopIteration, next, rows)
+
+        xs = [Var('x%d' % i) for i in range(40)]
+        row = next(iter_truth_table(A(*xs)))
+        self.assertEqual(row, [True] * 41)
+
+    def test_iter_truth_bits(self):
+        exprs = [p, T, Apqr, O(J(p, N(q)), D(p, q, r), X(r, s, N(T)))]
+        for expr in exprs:
+            blocks = list(iter_truth_bits(expr))
+            self.assertEqual(blocks, [expr.truth_bits()])
+            self.assertEqual(column_of_blocks(blocks), TruthTable(expr).values)
+
+        xs = [Var('x%d' % i) for i in range(14)]
+        expr = J(A(*xs[:7]), O(*xs[7:]))
+        blocks = list(iter_truth_bits(expr))
+        self.assertEqual(len(blocks), 2 ** (14 - BLOCK_VARIABLES))
+        column = column_of_blocks(blocks)
+        table = TruthTable(expr)
+        self.assertEqual(column, table.values)
+        self.assertEqual(column.bits(), expr.truth_bits()[0])
+
+        # a table can be made of the column computed in blocks
+        table = TruthTable(expr, column)
+        self.assertIs(table.values, column)
+        self.assertEqual(table.rows[5], TruthTable(expr).rows[5])
+
+        # a partial column, e.g. of a cancelled computation, is shorter
+        column = column_of_blocks(itertools.islice(iter_truth_bits(expr), 3))
+        self.assertEqual(len(column), 3 * 2 ** BLOCK_VARIABLES)
+
+class TestTable(unittest.TestCase):
+    def test_column_widths(self):
+        table = Table(['a', 'bb', 'c'])
+        self.assertEqual(table.column_widths, [1, 2, 1])
+        table.append([True, 'xyz', 1])
+        self.assertEqual(table.column_widths, [1, 3, 1])
+        table.extend([['wide', 'x', 22], [False, False, False]])
+        self.assertEqual(table.column_widths, [4, 3, 2])
+        self.assertEqual(table.rows[-1], ['F', 'F', 'F'])
+        self.assertRaises(Exception, table.append, ['too', 'short'])
+
+        widths = table.column_widths
+        table.update()
+        self.assertEqual(table.column_widths, widths)
+
+    def test_str(self):
+        table = Table(['p', 'long'])
+        table.extend([[True, 'x'], ['abcdef', False]])
+        self.assertEqual(str(table), '\n'.join([
+            '┌────────┬──────┐',
+            '│   p    │ long │',
+            '├────────┼──────┤',
+            '│   T    │  x   │',
+            '│ abcdef │  F   │',
+            '└────────┴──────┘',
+        ]) + '\n')
+
+# =============================================================================
+# Binary Decision Diagrams
+# =============================================================================
+
+class TestBDD(unittest.TestCase):
+    exprs = [p, T, F, Np, Apqr, Opqr, Jpq, Dpq, Xpq, Cpq, Epqrs,
+             C(A(Cpq, p), q), O(J(p, N(q)), D(p, q, r), X(r, s, N(T)))]
+
+    def test_evaluate(self):
+        for expr in self.exprs:
+            function = bdd.from_expression(expr)
+            names = expr.get_names()
+            for perm in bool_permutations(len(names)):
+                variables = dict(zip(names, perm))
+                self.assertEqual(function.evaluate(variables),
+                                 expr.evaluate(variables))
+
+    def test_count_models(self):
+        for expr in self.exprs:
+            bits, _ = expr.truth_bits()
+            self.assertEqual(bdd.count_models(expr), bin(bits).count('1'))
+        self.assertEqual(bdd.count_models(Apq, 'pqrs'), 4)
+        self.assertEqual(bdd.count_models(O(p, Np)), 2)
+        self.assertRaises(ValueError, bdd.count_models, Apq, 'p')
+
+        xs = [Var('x%d' % i) for i in range(200)]
+        expr = O(*[A(xs[i], xs[i + 1]) for i in range(0, 200, 2)])
+        self.assertEqual(bdd.count_models(expr), 2 ** 200 - 3 ** 100)
+
+    def test_equivalent(self):
+        self.assertTrue(bdd.equivalent(Cpq, O(Np, q)))
+        self.assertTrue(bdd.equivalent(N(Apq), O(Np, Nq)))
+        self.assertFalse(bdd.equivalent(Cpq, C(q, p)))
+        self.assertTrue(bdd.is_tautology(C(A(Cpq, p), q)))
+        self.assertFalse(bdd.is_tautology(Cpq))
+        for expr in self.exprs:
+            self.assertEqual(bdd.from_expression(expr).is_tautology(),
+                             expr.is_tautology())
+
+    def test_restrict_exists(self):
+        manager = bdd.BDD()
+        function = manager.build(C(A(p, q), r))
+        self.assertEqual(function.restrict({'p': True}),
+                         manager.build(C(q, r)))
+        self.assertEqual(function.restrict({'p': False}), manager.true())
+        self.assertEqual(function.exists(['r']), manager.true())
+        self.assertEqual(manager.build(Apqr).exists(['p', 'q']),
+                         manager.var('r'))
+        self.assertEqual(function.support(), ['p', 'q', 'r'])
+
+    def test_custom_operation(self):
+        manager = bdd.BDD()
+        function = manager.build(Maj(p, q, r))
+        self.assertEqual(function, manager.build(O(Apq, A(p, r), A(q, r))))
+        self.assertEqual(function.count_models(), 4)
+
+# =============================================================================
+# Simplification
+# =============================================================================
+
+class TestSimplify(unittest.TestCase):
+    def cost(self, expr):
+        # (products, literals) of a sum of products
+        products = expr.terms if isinstance(expr, Or) else [expr]
+        literals = [len(t) if isinstance(t, And) else 1 for t in products]
+        return len(products), sum(literals)
+
+    def test_simplify(self):
+        self.assertTrue(simplify(O(Apq, A(p, Nq))).identical(p))
+        self.assertTrue(simplify(Cpq).identical(O(Np, q)))
+        self.assertTrue(simplify(Dpq).identical(O(Np, Nq)))
+        self.assertTrue(simplify(Jpq).identical(O(A(p, Nq), A(Np, q))))
+        self.assertTrue(simplify(O(Apq, A(Np, r), A(q, r)))
+                        .identical(O(Apq, A(Np, r))))
+        self.assertTrue(simplify(O(p, Np)).identical(T))
+        self.assertTrue(simplify(A(p, Np)).identical(F))
+        self.assertTrue(simplify(T).identical(T))
+
+        # deep expressions of few variables do not overflow the stack
+        expr = p
+        for _ in range(3000):
+            expr = A(O(expr, q), Nr)
+        self.assertTrue(simplify(expr).identical(O(A(p, Nr), A(q, Nr))))
+
+    def test_minimum(self):
+        self.assertEqual(self.cost(simplify(Maj(p, q, r, s))), (4, 12))
+        self.assertEqual(self.cost(simplify(Epqr)), (4, 12))
+        # a cyclic chart, with no essential primes
+        cyclic = O(A(Np, Nq), A(Np, Nr), A(Nq, r), A(q, Nr), A(p, r), Apq)
+        self.assertEqual(self.cost(simplify(cyclic)), (3, 6))
+
+        for expr in TestBDD.exprs:
+            simple = simplify(expr)
+            self.assertTrue(simple.equivalent(expr))
+            self.assertTrue(set(simple.get_names()) <= set(expr.get_names()))
+
+    def test_heuristic(self):
+        # a multiplexer of 16 inputs, of 20 variables in all
+        select = [Var('s%d' % i) for i in range(4)]
+        products = []
+        for i in range(16):
+            literals = [s if i >> k & 1 else N(s)
+                        for k, s in enumerate(select)]
+            products.append(A(*literals + [Var('d%d' % i)]))
+        mux = O(*products)
+        self.assertEqual(self.cost(simplify(mux)), (16, 80))
+        self.assertTrue(bdd.equivalent(simplify(mux), mux))
+
+        # the redundant consensus terms of 24 variables
+        xs, ys, zs = [[Var('%s%d' % (c, i)) for i in range(8)] for c in 'xyz']
+        terms = [O(A(x, y), A(N(x), z), A(y, z))
+                 for x, y, z in zip(xs, ys, zs)]
+        self.assertEqual(self.cost(simplify(O(*terms))), (16, 32))
+
+        # matches the exact method on small expressions
+        import minimise
+        for expr in TestBDD.exprs + [O(Apq, A(Np, r), A(q, r)), Epqrs]:
+            names = expr.get_names()
+            self.assertEqual(sorted(minimise.minimise_heuristic(expr, names)),
+                             sorted(minimise.minimise_exact(expr, names)))
+
+# =============================================================================
+# Normal Forms
+# =============================================================================
+
+class TestNormalForms(unittest.TestCase):
+    exprs = TestBDD.exprs + [N(Jpq), N(Epqr), N(Cpq), X(Apq, Dpq),
+                             E(J(p, Nq), C(r, s), X(p, F)), Maj(p, Nq, r)]
+
+    def is_nnf(self, expr):
+        if isinstance(expr, Not):
+            return isinstance(expr.term, Var)
+        if isinstance(expr, (And, Or)):
+            return all(self.is_nnf(term) for term in expr)
+        return isinstance(expr, (Var, Unconditional))
+
+    def test_nnf(self):
+        self.assertTrue(nnf(N(Cpq)).identical(A(p, Nq)))
+        self.assertTrue(nnf(Dpq).identical(O(Np, Nq)))
+        self.assertTrue(nnf(N(Xpq)).identical(Opq))
+        self.assertTrue(nnf(Jpq).identical(O(A(p, Nq), A(Np, q))))
+        self.assertTrue(nnf(N(Epq)).identical(O(A(p, Nq), A(Np, q))))
+        for expr in self.exprs:
+            self.assertTrue(self.is_nnf(nnf(expr)), str(expr))
+            self.assertTrue(bdd.equivalent(nnf(expr), expr))
+
+        # the terms are shared, so a chain of Xor does not blow up
+        xs = [Var('x%d' % i) for i in range(100)]
+        chain = nnf(reduce(J, xs))
+        self.assertTrue(bdd.equivalent(chain, reduce(J, xs)))
+
+    def test_cnf_dnf(self):
+        cnf = to_cnf(E(p, A(q, Nr)))
+        self.assertEqual(cnf.names, {'p': 1, 'q': 2, 'r': 3})
+        self.assertEqual(cnf.clauses, [[1, -2, 3], [-1, 2], [-1, -3]])
+        self.assertTrue(cnf.to_expression().identical(
+            A(O(p, Nq, r), O(Np, q), O(Np, Nr))))
+        dnf = to_dnf(Jpq)
+        self.assertEqual(dnf.clauses, [[1, -2], [-1, 2]])
+        self.assertTrue(dnf.to_expression().identical(
+            O(A(p, Nq), A(Np, q))))
+
+        self.assertEqual(to_cnf(T).clauses, [])
+        self.assertEqual(to_cnf(F).clauses, [[]])
+        self.assertTrue(to_dnf(F).to_expression().identical(F))
+        self.assertTrue(to_dnf(O(p, Np)).to_expression().identical(T))
+
+        for expr in self.exprs:
+            self.assertTrue(bdd.equivalent(to_cnf(expr).to_expression(),
+                                           expr), str(expr))
+            self.assertTrue(bdd.equivalent(to_dnf(expr).to_expression(),
+                                           expr), str(expr))
+
+    def test_size_guard(self):
+        xs = [Var('x%d' % i) for i in range(16)]
+        chain = reduce(J, xs)
+        self.assertRaises(TooManyClausesError, to_cnf, chain)
+        self.assertRaises(TooManyClausesError, to_dnf, chain, 100)
+        self.assertEqual(len(to_cnf(reduce(J, xs[:8]))), 2 ** 7)
+
+        # an n-ary Biconditional is reduced a term at a time, each
+        # remaining chain shared between both polarities
+        xs = [Var('x%d' % i) for i in range(40)]
+        self.assertLess(len(DAG(nnf(E(*xs)))), 8 * 40)
+        self.assertRaises(TooManyClausesError, to_cnf, E(*xs[:24]))
+        self.assertRaises(TooManyClausesError, to_dnf, E(*xs[:24]))
+
+    def test_tseitin(self):
+        cnf = tseitin_cnf(C(p, A(q, r)))
+        self.assertEqual(cnf.names, {'p': 1, 'q': 2, 'r': 3})
+        self.assertTrue(all(isinstance(lit, int) and lit
+                            for clause in cnf.clauses for lit in clause))
+        self.assertEqual(len(cnf.to_expression().get_names()), cnf.num_vars)
+
+        # identical terms from separate parses are encoded once
+        text = '(p v ~q v r) ^ (~p v s) ^ (q v ~r v ~s)'
+        shared = parse(text)
+        self.assertEqual(tseitin_cnf(J(parse(text), parse(text))).num_vars,
+                         tseitin_cnf(J(shared, shared)).num_vars)
+
+        for expr in self.exprs:
+            cnf = tseitin_cnf(expr)
+            self.assertEqual(cnf.solve() is None, expr.is_contradiction())
+
+        # linear in the size of the expression
+        xs = [Var('x%d' % i) for i in range(16)]
+        self.assertLess(len(tseitin_cnf(reduce(J, xs))), 4 * 16)
+
+# =============================================================================
+# DIMACS
+# =============================================================================
+
+class TestDIMACS(unittest.TestCase):
+    text = (b'c an example\n'
+            b'c\n'
+            b'p cnf 4 3\n'
+            b' 1 -3 0 2\n'
+            b'3 -4\n'
+            b'0\n'
+            b'-2 0\n'
+            b'%\n'
+            b'0\n')
+
+    def test_read(self):
+        clauses = [[1, -3], [2, 3, -4], [-2]]
+        for chunk_size in (1, 2, 3, 7, DIMACS_CHUNK):
+            stream = io.BytesIO(self.text)
+            self.assertEqual(list(iter_dimacs(stream, None, chunk_size)),
+                             clauses)
+        cnf = read_dimacs(io.BytesIO(self.text))
+        self.assertEqual(cnf.clauses, clauses)
+        self.assertEqual(cnf.num_vars, 4)
+        self.assertEqual(cnf.names, {'x1': 1, 'x2': 2, 'x3': 3, 'x4': 4})
+        x1, x2, x3, x4 = [Var('x%d' % i) for i in range(1, 5)]
+        self.assertTrue(cnf.to_expression().identical(
+            A(O(x1, N(x3)), O(x2, x3, N(x4)), N(x2))))
+
+        self.assertEqual(read_dimacs(io.StringIO('1 0\n-1 2 0')).clauses,
+                         [[1], [-1, 2]])
+        self.assertEqual(read_dimacs(io.BytesIO(b'p cnf 0 0\n')).clauses, [])
+
+    def test_read_without_numpy(self):
+        import logic
+        module_numpy = logic.numpy
+        logic.numpy = None
+        try:
+            self.assertEqual(read_dimacs(io.BytesIO(self.text), 3).clauses,
+                             [[1, -3], [2, 3, -4], [-2]])
+            self.assertRaises(SyntaxError, read_dimacs, io.BytesIO(b'1 x 0'))
+        finally:
+            logic.numpy = module_numpy
+
+    def test_read_errors(self):
+        for text in [b'1 2', b'1 x 0\n', b'p dnf 1 1\n1 0\n',
+                     b'p cnf 1\n1 0\n', b'1 2.5 0\n']:
+            self.assertRaises(SyntaxError, read_dimacs, io.BytesIO(text))
+
+    def test_write(self):
+        expr = A(C(p, q), E(q, Nr))
+        cnf = tseitin_cnf(expr)
+        stream = io.StringIO()
+        write_dimacs(cnf, stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[:4], ['c var 1 p', 'c var 2 q', 'c var 3 r',
+                                     'p cnf %d %d' % (cnf.num_vars,
+                                                      len(cnf.clauses))])
+        self.assertEqual(lines[4], ' '.join(map(str, cnf.clauses[0] + [0])))
+
+        stream = io.BytesIO()
+        write_dimacs(expr, stream)
+        stream.seek(0)
+        read = read_dimacs(stream)
+        self.assertEqual(read.clauses, cnf.clauses)
+        self.assertEqual(read.names['q'], 2)
+        self.assertEqual(read.names['x4'], 4)
+
+        # many clauses, across many chunks
+        cnf = CNF()
+        cnf.clauses = [[i, -(i + 1), i + 2] for i in range(1, 5000)]
+        cnf.num_vars = 5001
+        stream = io.BytesIO()
+        write_dimacs(cnf, stream)
+        stream.seek(0)
+        self.assertEqual(read_dimacs(stream, 1000).clauses, cnf.clauses)
+
+# =============================================================================
+# Circuits
+# =============================================================================
+
+class TestCircuit(unittest.TestCase):
+    def test_from_expression(self):
+        shared = A(p, N(q))
+        expr = O(shared, C(shared, r), E(T, N(q), s))
+        c = circuit.from_expression(expr)
+        self.assertEqual(c.names(), ['p', 'q', 'r', 's'])
+        self.assertEqual(len(c), 5)
+        self.assertTrue(c.expressions()['out'].identical(expr))
+        self.assertTrue(c.expression(c.gates[0]).identical(Nq))
+
+        # expressions added later share the inputs
+        node = c.add_expression(J(p, s), 'x')
+        self.assertIs(node.terms[0], c.inputs[0])
+        self.assertEqual(list(c.outputs), ['out', 'x'])
+
+    def test_set(self):
+        expr = O(A(p, N(q)), C(A(p, N(q)), r), X(q, s))
+        c = circuit.from_expression(expr)
+        out = c.outputs['out']
+        names = c.names()
+        for perm in bool_permutations(len(names)):
+            values = dict(zip(names, perm))
+            changed = c.set(values)
+            self.assertEqual(out.value, expr.evaluate(values))
+            for node in c.gates:
+                self.assertEqual(node.value, bool(node.rule(
+                    *[term.value for term in node.terms])))
+            self.assertEqual(len(set(changed)), len(changed))
+
+        # only the fan-out of the input changed is reevaluated
+        c.set({'p': False, 'q': False, 'r': False, 's': False})
+        changed = c.set({'s': True})
+        self.assertEqual([node.op_class for node in changed[1:]], [X])
+
+    def test_order(self):
+        c = circuit.Circuit()
+        a, b = c.add_input('a', True), c.add_input('b')
+        first = c.add_gate(A, a, b)
+        second = c.add_gate(N, a)
+        # feed the first gate from the second, added after it
+        first.terms.append(second)
+        second.fanout.append(first)
+        c.ranks = None
+        self.assertEqual(c.order(), [second, first])
+        c.set({'a': False, 'b': True})
+        self.assertFalse(first.value)
+        self.assertTrue(second.value)
+
+        # removing a would leave the Not gate without a term
+        self.assertRaises(TypeError, c.remove, a)
+        self.assertEqual(c.inputs, [a, b])
+        self.assertEqual(second.terms, [a])
+        self.assertEqual(a.fanout, [first, second])
+        self.assertEqual(c.remove(second), [first])
+        self.assertEqual(first.terms, [a, b])
+        self.assertRaises(TypeError, c.remove, b)
+        c.set({'a': True, 'b': True})
+        self.assertTrue(first.value)
+        self.assertRaises(TypeError, c.add_gate, N, a, b)
+        self.assertRaises(TypeError, c.add_gate, A, a)
+        self.assertRaises(TypeError, c.add_gate, J, a, b, a)
+
+    def test_simulate(self):
+        c = circuit.Circuit()
+        c.add_expression(O(A(p, N(q)), E(q, r, F)), 'x')
+        c.add_expression(Maj(p, q, r), 'y')
+        names = c.names()
+        assignments = [dict(zip(names, perm))
+                       for perm in bool_permutations(len(names))]
+        results = c.simulate(assignments)
+        self.assertEqual(len(results), 8)
+        for values, result in zip(assignments, results):
+            self.assertEqual(list(result), ['x', 'y'])
+            for name, expr in c.expressions().items():
+                self.assertEqual(result[name], expr.evaluate(values))
+
+        self.assertEqual(c.simulate_bits({'p': 0b01, 'q': 0b10, 'r': 0b11},
+                                         0b11), {'x': 0b01, 'y': 0b11})
+        self.assertEqual(c.simulate([]), [])
+
+    def test_json(self):
+        c = circuit.from_expression(O(A(p, N(q)), C(T, N(q))))
+        stream = io.StringIO()
+        c.save(stream)
+        stream.seek(0)
+        loaded = circuit.load(stream)
+        self.assertEqual(loaded.to_json(), c.to_json())
+        self.assertTrue(loaded.expressions()['out'].identical(
+            c.expressions()['out']))
+        self.assertEqual(c.to_json()['gates'][0], ['Not', 1])
+
+        invalid = [
+            {'inputs': ['p'], 'gates': [['And', 0, 1]]},
+            {'inputs': ['p'], 'gates': [['Not', 1], ['Not', 0]]},
+            {'inputs': ['p'], 'gates': [['Nope', 0]]},
+            {'inputs': ['p'], 'gates': [[]]},
+            {'inputs': ['p', 'q'], 'gates': [['Not', 0, 1]]},
+            {'inputs': ['p'], 'outputs': [['out', 1]]},
+        ]
+        for data in invalid:
+            self.assertRaises(ValueError, circuit.from_json, data)
+
+    def test_synthesize(self):
+        gates = set([A, O, N, D, X, J])
+        exprs = [
+            C(A(p, q), J(r, p)), A(p, q, r, s, N(p)), N(O(p, q, r, s)),
+            E(p, q, r, s), N(J(p, N(q))), Maj(p, O(q, r), N(s)),
+            O(A(p, N(q)), C(A(p, N(q)), r), X(q, s), E(T, s)),
+        ]
+        for expr in exprs:
+            for optimize in ('gates', 'depth'):
+                c = circuit.synthesize(expr, optimize)
+                self.assertTrue(c.expressions()['out'].equivalent(expr))
+                for gate in c.gates:
+                    self.assertIn(gate.op_class, gates)
+                    self.assertTrue(len(gate.terms) <= 2)
+
+        # n-ary operations become balanced trees
+        c = circuit.synthesize(A(*[Var('x%d' % i) for i in range(16)]))
+        self.assertEqual(c.report(), 'Gates: 15, depth: 4')
+        self.assertEqual(circuit.synthesize(N(Opqrs)).report(),
+                         'Gates: 3, depth: 2')
+        self.assertEqual(circuit.synthesize('(p ^ q) -> r').report(),
+                         'Gates: 2, depth: 2')
+        self.assertEqual(circuit.synthesize(Epqrs).depth(), 3)
+
+        # shared terms are built once
+        shared = J(J(p, q), J(r, s))
+        c = circuit.synthesize(O(A(shared, s), A(shared, N(s))))
+        self.assertEqual(c.report(), 'Gates: 7, depth: 4')
+        self.assertEqual(circuit.synthesize(A(p, T)).report(),
+                         'Gates: 0, depth: 0')
+        self.assertEqual(circuit.synthesize(O(p, Np)).constants[0].value,
+                         True)
+
+        # reusing a deep gate saves a gate, but costs depth
+        expr = J(A(shared, s), A(Var('a'), shared, s))
+        fewest = circuit.synthesize(expr, 'gates')
+        shallowest = circuit.synthesize(expr, 'depth')
+        self.assertEqual(fewest.report(), 'Gates: 6, depth: 5')
+        self.assertEqual(shallowest.report(), 'Gates: 7, depth: 4')
+        self.assertRaises(ValueError, circuit.synthesize, p, 'area')
+
 # =============================================================================
 # Parser
 # =============================================================================
@@ -469,6 +1404,64 @@ class TestParser(unittest.TestCase):
 
 
 
+    def test_errors(self):
+        errors = [
+            ('', 'expected a variable, unconditional, `~`, or `(`, saw EOE'),
+            ('~', 'expected a variable, unconditional, `~`, or `(`, saw EOE'),
+            ('p ^', 'expected a variable, unconditional, `~`, or `(`, saw EOE'),
+            ('()', 'expected a variable, unconditional, `~`, or `(`, saw EOE'),
+            ('p ^ ^ q', 'expected a variable, unconditional, `~`, or `(`, saw `^`'),
+            ('p ^ )', 'expected a variable, unconditional, `~`, or `(`, saw `)`'),
+            ('p q', 'expected an operation or EOE, saw `q`'),
+            ('(p q)', 'expected an operation or EOE, saw `q`'),
+            ('p ^ q)', 'expected an operation or EOE, saw `)`'),
+            ('(p', 'expected an operation or `)`, saw EOE'),
+            ('p ^ (q ^', 'expected an operation or `)`, saw EOE'),
+        ]
+        for expr, message in errors:
+            with self.assertRaises(SyntaxError) as cm:
+                parse(expr)
+            self.assertEqual(str(cm.exception), message)
+        self.assertRaises(TypeError, parse, 'p -> q -> r')
+
+    def test_cache(self):
+        cache = enable_parse_cache(2)
+        try:
+            expr = parse('p ^ q')
+            self.assertTrue(expr.identical(Apq))
+            self.assertTrue(expr.frozen)
+            self.assertRaises(TypeError, expr.append, r)
+            self.assertIs(parse('p&q'), expr)
+            self.assertIs(parse(' p   ^ q '), expr)
+            self.assertIsNot(parse('p AND q'), expr)
+            self.assertTrue(parse('~p').identical(parse('!p')))
+            self.assertTrue(parse('v ^ p').identical(A(Var('v'), p)))
+            self.assertTrue(parse('or ^ p').identical(A(Var('or'), p)))
+            self.assertEqual(cache.info(), {'hits': 3, 'misses': 5,
+                                            'evictions': 3, 'size': 2,
+                                            'maxsize': 2})
+        finally:
+            disable_parse_cache()
+        self.assertFalse(parse('p ^ q').frozen)
+
+    def test_chained_biconditionals(self):
+        self.assertTrue(parse('p <-> q -> r ^ s <-> p')
+                        .identical(E(p, C(q, A(r, s)), p)))
+
+    def test_deep_nesting(self):
+        depth = 10 * sys.getrecursionlimit()
+        expr = parse('(' * depth + 'p' + ')' * depth)
+        self.assertTrue(expr.identical(p))
+        expr = parse('~' * depth + 'p')
+        for _ in range(depth):
+            expr = expr.term
+        self.assertIs(type(expr), Var)
+
+    def test_long(self):
+        names = ['x%d' % i for i in range(10000)]
+        expr = parse(' ^ '.join(names))
+        self.assertEqual(len(expr), 10000)
+
 # and expecting exceptions?
 
 